@@ -0,0 +1,136 @@
+"""
+本地模拟 LLM 接口 (OpenAI Chat Completions 兼容，支持 stream)
+用于在单机上测试分片/并发流程而不消耗真实额度
+
+用法:
+    python scripts/mock_llm_server.py --port 8765 --latency 0.2
+    API_URL=http://127.0.0.1:8765/v1 python -m src.llm.shard launch --stage classify --num-shards 4
+"""
+import argparse
+import hashlib
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CATEGORIES = [
+    "中印边界/边境问题", "西藏/达赖喇嘛问题", "台湾问题", "一带一路与周边地缘",
+    "中印经贸与科技", "中国经济现状", "中印军力与国防", "中国国内政治",
+    "中印双边关系", "中国外交", "中印签证与人文", "其他"
+]
+
+def fake_logprobs(text, user_content):
+    """按 4 个字符切分输出，给出确定性的 token logprobs (含前 5 候选)"""
+    content = []
+    for i in range(0, len(text), 4):
+        piece = text[i:i + 4]
+        seed = int(hashlib.md5(f"{user_content}\x1f{i}".encode('utf-8')).hexdigest(), 16)
+        top1 = -(seed % 100) / 1000
+        gap = (seed >> 8) % 400 / 100
+        candidates = [{"token": piece, "logprob": top1, "bytes": list(piece.encode('utf-8'))}]
+        candidates += [{"token": f"<alt{k}>", "logprob": top1 - gap - k, "bytes": None} for k in range(4)]
+        content.append({**candidates[0], "top_logprobs": candidates})
+    return {"content": content}
+
+def fake_answer(system_prompt, user_content):
+    """根据输入内容的哈希给出确定性的假结果，方便核对合并结果"""
+    seed = int(hashlib.md5(user_content.encode('utf-8')).hexdigest(), 16)
+    if '"box_title"' in system_prompt:
+        return {
+            "box_title": "总体态势：模拟 | 模拟 | 模拟",
+            "focus": "模拟核心焦点", "risk": "模拟风险预警",
+            "strategic": "模拟战略研判", "economic": "模拟经贸研判",
+            "recommendations": [{"title": "模拟领域", "text": "模拟建议"}],
+            "signals": [{"title": "模拟信号", "text": "模拟说明"}]
+        }
+    if '"narrative"' in system_prompt:
+        return {
+            "narrative": f"模拟叙事 {seed % 1000}",
+            "key_events": [{"title": "模拟事件", "media": "《模拟报》", "date": "12月8日", "summary": "模拟事件摘要"}]
+        }
+    if '"category"' in system_prompt:
+        # 提示词变化时约一半 "漂移分类" 的文章改判，用于测试重标注流程
+        drift = int(hashlib.md5(system_prompt.encode('utf-8')).hexdigest(), 16) % len(CATEGORIES)
+        index = seed % len(CATEGORIES)
+        if index == drift and (seed >> 8) % 2:
+            index = (index + 8) % len(CATEGORIES)
+        return {
+            "category": CATEGORIES[index],
+            "reason": "模拟接口返回的分类理由"
+        }
+    return {
+        "Chinese_Entities": ["PLA"],
+        "Indian_Entities": ["Indian Army"],
+        "Sentiment_Score": seed % 11 - 5,
+        "Summary_CN": "模拟摘要",
+        "Summary_EN": "Mock summary"
+    }
+
+class MockHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        messages = body.get('messages', [])
+        system_prompt = messages[0]['content'] if messages else ""
+        user_content = messages[-1]['content'] if messages else ""
+        text = json.dumps(fake_answer(system_prompt, user_content), ensure_ascii=False)
+
+        finish_reason = "stop"
+        max_tokens = body.get('max_tokens')
+        if max_tokens and len(text) > max_tokens:
+            text, finish_reason = text[:max_tokens], "length"
+
+        time.sleep(self.latency)
+        if body.get('stream'):
+            self._send_stream(text, finish_reason)
+        else:
+            self._send_json({
+                "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": body.get('model'),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish_reason,
+                             "logprobs": fake_logprobs(text, user_content) if body.get('logprobs') else None}],
+                "usage": {"prompt_tokens": len(user_content) // 4, "completion_tokens": len(text) // 4,
+                          "total_tokens": (len(user_content) + len(text)) // 4}
+            })
+
+    def _send_json(self, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, text, finish_reason):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        try:
+            for i in range(0, len(text), 4):
+                chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": "mock",
+                         "choices": [{"index": 0, "delta": {"content": text[i:i + 4]}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+            chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": "mock",
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前结束 (stop_after_category) 时会主动断开
+            pass
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 LLM 接口")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="每个请求的模拟延迟 (秒)")
+    args = parser.parse_args()
+
+    MockHandler.latency = args.latency
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    print(f"模拟 LLM 接口已启动: http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from dotenv import dotenv_values
 
@@ -15,6 +16,10 @@ EXTERNAL_DATA_DIR = DATA_DIR / "external"
 # 结果路径
 FIGURES_DIR = PROJECT_DIR / "results" / "figures"
 TABLES_DIR = PROJECT_DIR / "results" / "tables"
+REPORTS_DIR = PROJECT_DIR / "results" / "reports"
+
+# Prompt 文件路径
+PROMPT_DIR = PROJECT_DIR / "prompt"
 
 # 隐私变量路径
 ENV_DIR = PROJECT_DIR / ".env"
@@ -26,8 +31,55 @@ for path in [DATA_DIR, FIGURES_DIR, TABLES_DIR]:
 # 媒体黑名单
 BLACK_MEDIAS = ['The Tribune-Democrat']
 
-# 将配置读取为字典
+# 合法分类 (与 SYSTEM_PROMPT_01 的 Allowed Values 一致)
+VALID_CATEGORIES = [
+    "中印边界/边境问题",
+    "西藏/达赖喇嘛问题",
+    "台湾问题",
+    "一带一路与周边地缘",
+    "中印经贸与科技",
+    "中国经济现状",
+    "中印军力与国防",
+    "中国国内政治",
+    "中印双边关系",
+    "中国外交",
+    "中印签证与人文",
+    "其他"
+]
+
+# 实体别名表：标准名 -> 别名列表 (比较时忽略大小写、首尾引号与开头的 "the")
+# 可在 data/external/entity_aliases.csv (alias, canonical) 中继续补充
+# 中方/印方实体共用同一张表：不要加入两侧含义不同或过短的简称 (如 MFA、Xi、ED)
+ENTITY_ALIASES = {
+    "People's Liberation Army": ["PLA", "Chinese Army", "Chinese military", "China's military", "PLA Army"],
+    "Communist Party of China": ["CPC", "CCP", "Chinese Communist Party"],
+    "Ministry of Foreign Affairs of China": ["Chinese Foreign Ministry", "China's Foreign Ministry"],
+    "Xi Jinping": ["President Xi", "Chinese President Xi Jinping"],
+    "Wang Yi": ["Foreign Minister Wang Yi", "Chinese Foreign Minister Wang Yi"],
+    "Ministry of External Affairs": ["MEA", "External Affairs Ministry", "India's Ministry of External Affairs"],
+    "Indian Army": ["Army (India)"],
+    "Indian Air Force": ["IAF"],
+    "Narendra Modi": ["Modi", "PM Modi", "Prime Minister Modi", "Prime Minister Narendra Modi"],
+    "S. Jaishankar": ["Jaishankar", "S Jaishankar", "EAM Jaishankar", "Subrahmanyam Jaishankar"],
+    "Adani Group": ["Adani", "Adani Enterprises"],
+    "Tata Group": ["Tata", "Tata Sons"],
+}
+
+# 各阶段单篇文章的输入 token 预算 (超出部分按 "导语 + 结尾" 截取，None 表示不截取)
+TOKEN_BUDGETS = {
+    'classify': 1500,
+    'summarize': 3000,
+}
+
+# 报告生成 (map-reduce) 每次调用的输入 token 预算
+REPORT_MAP_TOKEN_BUDGET = 6000
+REPORT_REDUCE_TOKEN_BUDGET = 6000
+
+# 将配置读取为字典 (同名环境变量优先，便于多进程/多节点分别指定接口地址与密钥)
 config = dotenv_values(ENV_DIR)
+for key in ["API_URL", "API_KEY", "MODEL_NAME", "MAX_WORKERS"]:
+    if key in os.environ:
+        config[key] = os.environ[key]
 
 API_URL = config["API_URL"]
 API_KEY = config["API_KEY"]
@@ -179,4 +231,73 @@ You must respond with a strictly valid JSON object. Do not include markdown form
   "Summary_CN": "String",     // Max 50 words
   "Summary_EN": "String"      // Max 50 words
 }
-"""
\ No newline at end of file
+"""
+
+REPORT_MAP_PROMPT = """
+# Role & Objective
+You are a **Senior Intelligence Analyst** at a Chinese think tank, writing the periodic brief "印媒动态追踪" on how Indian media cover China.
+The input is a batch of article summaries (Summary_CN) that all belong to **one topic category**. Each line has the format:
+[date] 《media》 (sentiment score -5..+5) summary
+
+Your task is to condense this batch into a **partial brief** for the topic.
+
+# Requirements
+* **narrative**: 2-4 sentences in Simplified Chinese describing the main narrative of Indian media on this topic in this batch (主要叙事). Be factual, BLUF style.
+* **key_events**: the most important distinct events (at most 3). Merge duplicated coverage of the same event. For each event give:
+    * "title": a short Chinese headline (少于30字)
+    * "media": the outlet name in Chinese with book-title marks if commonly known (e.g. 《印度时报》), otherwise the original name
+    * "date": the date as given, format "M月D日"
+    * "summary": 2-3 sentences in Chinese (少于120字)
+
+# Output Format
+You must respond with a strictly valid JSON object. Do not include markdown formatting (like ```json), introduction, or explanation outside the JSON.
+{
+  "narrative": "String",
+  "key_events": [{"title": "String", "media": "String", "date": "String", "summary": "String"}]
+}
+"""
+
+REPORT_REDUCE_PROMPT = """
+# Role & Objective
+You are a **Senior Intelligence Analyst** editing the periodic brief "印媒动态追踪".
+The input is a list of **partial briefs** (JSON objects) for **one topic category**, each covering a sub-period or a batch of articles.
+Merge them into **one** brief for the topic over the whole period.
+
+# Requirements
+* **narrative**: 3-5 sentences in Simplified Chinese synthesizing the overall narrative (主要叙事) across all partial briefs. Highlight trends and shifts, not a list.
+* **key_events**: select the most important distinct events across all partial briefs (at most 3). Keep their fields unchanged unless merging duplicates.
+
+# Output Format
+You must respond with a strictly valid JSON object. Do not include markdown formatting (like ```json), introduction, or explanation outside the JSON.
+{
+  "narrative": "String",
+  "key_events": [{"title": "String", "media": "String", "date": "String", "summary": "String"}]
+}
+"""
+
+REPORT_OVERVIEW_PROMPT = """
+# Role & Objective
+You are the **Chief Analyst** writing the front-page assessment (核心研判) of the periodic brief "印媒动态追踪".
+The input contains, for every topic category, its article count, share, average sentiment score (-5..+5) and its merged brief.
+
+# Requirements (all text in Simplified Chinese)
+* **box_title**: "总体态势：" followed by three short phrases joined by " | " (e.g. "总体态势：外交博弈主导 | 人文摩擦升温 | 经贸依赖加深")
+* **focus**: 核心焦点, 2-4 sentences citing the dominant topics with their shares.
+* **risk**: 风险预警, 2-3 sentences on the most negative narratives.
+* **strategic**: 战略层面研判, 2-3 sentences.
+* **economic**: 经贸层面研判, 2-3 sentences.
+* **recommendations**: 2-4 items, each {"title": "领域 (少于8字)", "text": "建议 (少于80字)"}.
+* **signals**: 异常与微弱信号, 1-3 items, each {"title": "信号标题", "text": "说明与研判 (少于150字)"}.
+
+# Output Format
+You must respond with a strictly valid JSON object. Do not include markdown formatting (like ```json), introduction, or explanation outside the JSON.
+{
+  "box_title": "String",
+  "focus": "String",
+  "risk": "String",
+  "strategic": "String",
+  "economic": "String",
+  "recommendations": [{"title": "String", "text": "String"}],
+  "signals": [{"title": "String", "text": "String"}]
+}
+"""
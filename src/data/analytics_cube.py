@@ -0,0 +1,195 @@
+"""
+分析立方体：按 日期 × 媒体来源 × 分类 × 情感得分 预聚合文章数
+
+最细粒度为 "天"，周度等粗粒度在查询时上卷 (立方体规模远小于原始数据，上卷耗时可忽略)
+每篇文章在立方体中的落点记录在成员表中，增量更新时只处理新增或标签发生变化的文章：
+旧落点减一、新落点加一，无需重算历史
+"""
+from src import config
+import pandas as pd
+
+CUBE_PATH = config.PROCESSED_DATA_DIR / 'analytics_cube.csv'
+MEMBERS_PATH = config.PROCESSED_DATA_DIR / 'analytics_cube_members.csv'
+
+CUBE_KEYS = ['date', 'source_media', 'category', 'Sentiment_Score']
+# 情感得分的错误哨兵值 (与 llm_summarize 中一致)，缺失的得分也归入此值
+ERROR_SCORE = -999
+VALID_SCORES = list(range(-5, 6))
+
+# 读取缓存：文件未变化时直接复用内存中的立方体
+_CACHE = {}
+
+def to_day(series):
+    """把发布时间统一解析为不带时区的日期 (带时区的时间先转换到 UTC)"""
+    parsed = pd.to_datetime(series, errors='coerce', utc=True)
+    return parsed.dt.tz_localize(None).dt.normalize()
+
+def cube_members(df):
+    """从行级数据中提取每篇文章在立方体中的落点"""
+    if 'Sentiment_Score' in df.columns:
+        score = pd.to_numeric(df['Sentiment_Score'], errors='coerce')
+        score = score.where(score.isin(VALID_SCORES), ERROR_SCORE)
+    else:
+        score = pd.Series(ERROR_SCORE, index=df.index)
+    members = pd.DataFrame({
+        'article_id': df['article_id'].astype(str),
+        'date': to_day(df['publish_date']),
+        'source_media': df['source_media'].fillna('未知'),
+        'category': df['category'].fillna('未分类'),
+        'Sentiment_Score': score.astype(int),
+    })
+    return members.dropna(subset=['date'])
+
+def _read(path, columns):
+    if not path.exists():
+        return pd.DataFrame(columns=columns)
+    df = pd.read_csv(path, parse_dates=['date'])
+    df['Sentiment_Score'] = df['Sentiment_Score'].astype(int)
+    return df
+
+def load_cube(cube_path=CUBE_PATH):
+    """读取立方体 (带缓存)"""
+    if not cube_path.exists():
+        return pd.DataFrame(columns=CUBE_KEYS + ['count'])
+    mtime = cube_path.stat().st_mtime_ns
+    cached = _CACHE.get(cube_path)
+    if cached is None or cached[0] != mtime:
+        _CACHE[cube_path] = (mtime, _read(cube_path, CUBE_KEYS + ['count']))
+    return _CACHE[cube_path][1]
+
+def update_cube(df, cube_path=CUBE_PATH, members_path=MEMBERS_PATH):
+    """
+    用新标注的行增量更新立方体
+    :param df: 至少包含 article_id, publish_date, source_media, category 列 (Sentiment_Score 可缺省)
+    """
+    print("-" * 50)
+    print("【更新分析立方体】")
+    if 'article_id' not in df.columns:
+        from src.data.data_clean import add_article_id
+        df = add_article_id(df.copy())
+    new = cube_members(df).drop_duplicates('article_id', keep='last')
+    old = _read(members_path, ['article_id'] + CUBE_KEYS)
+    old['article_id'] = old['article_id'].astype(str)
+
+    # 找出新增文章与落点发生变化的文章
+    compare = new.merge(old, on='article_id', how='left', suffixes=('', '_old'), indicator=True)
+    is_new = compare['_merge'] == 'left_only'
+    is_changed = ~is_new & (compare[CUBE_KEYS].values != compare[[f'{k}_old' for k in CUBE_KEYS]].values).any(axis=1)
+    changed_ids = compare.loc[is_new | is_changed, 'article_id']
+    print(f"输入 {len(new)} 篇，新增 {is_new.sum()} 篇，标签变化 {is_changed.sum()} 篇")
+    if changed_ids.empty:
+        print("立方体无需更新")
+        print("-" * 50)
+        return load_cube(cube_path)
+
+    # 旧落点减一、新落点加一
+    added = new[new['article_id'].isin(changed_ids)]
+    removed = old[old['article_id'].isin(changed_ids)]
+    parts = [added.groupby(CUBE_KEYS).size()]
+    if not removed.empty:
+        parts.append(-removed.groupby(CUBE_KEYS).size())
+    cube = load_cube(cube_path)
+    if not cube.empty:
+        parts.insert(0, cube.set_index(CUBE_KEYS)['count'])
+    cube = pd.concat(parts).groupby(level=CUBE_KEYS).sum()
+    cube = cube[cube > 0].astype(int).rename('count').reset_index().sort_values(CUBE_KEYS, kind='stable')
+
+    kept = old[~old['article_id'].isin(changed_ids)]
+    members = added if kept.empty else pd.concat([kept, added], ignore_index=True)
+
+    cube_path.parent.mkdir(parents=True, exist_ok=True)
+    cube.to_csv(cube_path, index=False, encoding='utf-8-sig')
+    members.to_csv(members_path, index=False, encoding='utf-8-sig')
+    print(f"立方体共 {len(cube)} 个单元，覆盖 {len(members)} 篇文章，已保存至: {cube_path}")
+    print("-" * 50)
+    return load_cube(cube_path)
+
+def remove_from_cube(article_ids, cube_path=CUBE_PATH, members_path=MEMBERS_PATH):
+    """从立方体中撤销指定文章 (如重标注后不再进入分析的文章)，返回撤销的篇数"""
+    members = _read(members_path, ['article_id'] + CUBE_KEYS)
+    members['article_id'] = members['article_id'].astype(str)
+    removed = members['article_id'].isin(pd.Index(article_ids).astype(str))
+    if not removed.any():
+        return 0
+    cube = pd.concat([
+        load_cube(cube_path).set_index(CUBE_KEYS)['count'],
+        -members[removed].groupby(CUBE_KEYS).size(),
+    ]).groupby(level=CUBE_KEYS).sum()
+    cube = cube[cube > 0].astype(int).rename('count').reset_index().sort_values(CUBE_KEYS, kind='stable')
+    cube.to_csv(cube_path, index=False, encoding='utf-8-sig')
+    members[~removed].to_csv(members_path, index=False, encoding='utf-8-sig')
+    return int(removed.sum())
+
+def build_cube(df, cube_path=CUBE_PATH, members_path=MEMBERS_PATH):
+    """从头重建立方体 (删除已有文件后全量更新)"""
+    for path in (cube_path, members_path):
+        path.unlink(missing_ok=True)
+    return update_cube(df, cube_path, members_path)
+
+def query_cube(
+    by=('category',),
+    freq=None,
+    start=None,
+    end=None,
+    source_media=None,
+    category=None,
+    distribution=False,
+    cube=None
+):
+    """
+    查询立方体
+    :param by: 分组维度，可选 'source_media', 'category', 'Sentiment_Score'
+    :param freq: 时间粒度，None 表示不按时间分组，'D' 为按天，'W' 为按周 (周一为起点)，'M' 为按月
+    :param start / end: 日期范围 (闭区间)
+    :param source_media / category: 过滤条件，可为单个值或列表
+    :param distribution: 是否附带各情感得分的文章数分布 (score_-5 ... score_5)
+    :return: DataFrame，包含 文章数 count、有效情感文章数 valid_count、平均情感 mean_sentiment
+    """
+    if cube is None:
+        if not CUBE_PATH.exists():
+            raise FileNotFoundError(f"分析立方体不存在，请先运行 build_cube 或 update_cube: {CUBE_PATH}")
+        cube = load_cube()
+    mask = pd.Series(True, index=cube.index)
+    if start is not None:
+        mask &= cube['date'] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= cube['date'] <= pd.Timestamp(end)
+    for col, value in (('source_media', source_media), ('category', category)):
+        if value is not None:
+            values = [value] if isinstance(value, str) else list(value)
+            mask &= cube[col].isin(values)
+    data = cube[mask].copy()
+
+    keys = list(by)
+    if freq is not None:
+        if freq == 'D':
+            data['period'] = data['date']
+        elif freq == 'W':
+            data['period'] = data['date'] - pd.to_timedelta(data['date'].dt.weekday, unit='D')
+        elif freq == 'M':
+            data['period'] = data['date'].dt.to_period('M').dt.to_timestamp()
+        else:
+            raise ValueError(f"不支持的时间粒度: {freq} (可选 'D' / 'W' / 'M')")
+        keys = ['period'] + keys
+
+    valid = data['Sentiment_Score'] != ERROR_SCORE
+    data['valid_count'] = data['count'].where(valid, 0)
+    data['score_sum'] = (data['count'] * data['Sentiment_Score']).where(valid, 0)
+    if keys:
+        result = data.groupby(keys)[['count', 'valid_count', 'score_sum']].sum()
+    else:
+        result = data[['count', 'valid_count', 'score_sum']].sum().to_frame().T
+    result['mean_sentiment'] = result['score_sum'] / result['valid_count'].where(result['valid_count'] > 0)
+    result = result.drop(columns='score_sum')
+
+    if distribution:
+        scores = data[valid]
+        if keys:
+            dist = scores.pivot_table(index=keys, columns='Sentiment_Score', values='count', aggfunc='sum', fill_value=0)
+        else:
+            dist = scores.groupby('Sentiment_Score')['count'].sum().to_frame().T.set_axis(result.index)
+        dist = dist.reindex(columns=VALID_SCORES, fill_value=0)
+        dist.columns = [f'score_{s}' for s in VALID_SCORES]
+        result = result.join(dist)
+        result[dist.columns] = result[dist.columns].fillna(0).astype(int)
+    return result.reset_index() if keys else result.reset_index(drop=True)
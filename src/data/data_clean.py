@@ -1,5 +1,43 @@
+import hashlib
+import numpy as np
 import pandas as pd
 from src import config
+
+# 原始数据中不需要的列
+DROP_COLUMNS = ['pub_time', 'pub_date', 'author', 'words', 'language', 'company', 'industry', 'subject', 'region', 'layout', 'abstracts']
+RENAME_COLUMNS = {
+    'headline': 'title',
+    'source': 'source_media'
+}
+# 媒体来源合并映射：来源名包含 key (忽略大小写) 的统一改为 target
+MEDIA_REPLACEMENTS = {
+    'Times of India': 'The Times of India',
+    'Economic Times': 'The Economic Times',
+    'India Today': 'India Today',
+    'Indian Express': 'Indian Express',
+    'Financial Express': 'Financial Express',
+    'BusinessLine': 'BusinessLine', # 这里把 BusinessLine Online 统一为 BusinessLine
+    'The Hindu': 'The Hindu'
+}
+# 发布时间统一写出到秒：pandas 默认在整列都是零点时只写日期，
+# 分块写出时各块的判断可能不同，固定格式保证整表与分块写出的结果一致
+CSV_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+DIGEST_PATH = config.INTERIM_DATA_DIR / 'dedup_digests.npy'
+
+def article_digest(title, content):
+    """
+    根据标题+内容计算文章摘要值 (与去重规则一致)，作为稳定的文章 ID
+    缺失值单独编码，避免与字符串 "nan" 混淆
+    """
+    parts = ['\x00' if pd.isna(v) else str(v) for v in (title, content)]
+    return hashlib.blake2b('\x1f'.join(parts).encode('utf-8'), digest_size=8).hexdigest()
+
+def add_article_id(df):
+    """如果没有 article_id 列，则按标题+内容生成 (16 位十六进制字符串)"""
+    if 'article_id' not in df.columns:
+        df['article_id'] = [article_digest(t, c) for t, c in zip(df['title'], df['content'])]
+    return df
+
 def basic_clean(df):
     """基础清理函数"""
     print("-" * 50) # 打印分隔线
@@ -10,14 +48,11 @@ def basic_clean(df):
     print(f"转换后的publish_date示例: {df.iloc[5]['publish_date']}")
     # 删除不需要的列
     print("正在删除不需要数据列")
-    df = df.drop(columns=['pub_time','pub_date','author','words', 'language', 'company', 'industry', 'subject', 'region', 'layout', 'abstracts'])
+    df = df.drop(columns=DROP_COLUMNS)
     print(f"剩余列名如下: {df.columns.tolist()}")
     # 重命名列
     print("正在重命名列")
-    df.rename(columns={
-    'headline': 'title',
-    'source': 'source_media'
-    }, inplace=True)
+    df.rename(columns=RENAME_COLUMNS, inplace=True)
     print(f"重命名后列名如下: {df.columns.tolist()}")
     # 去除重复数据（重复判定规则为标题+内容）
     num_1 = len(df)
@@ -25,6 +60,8 @@ def basic_clean(df):
     df.drop_duplicates(subset=['title', 'content'], inplace=True)
     num_2 = len(df)
     print("共去除重复数据:", num_1 - num_2, "去除后数据量为:", num_2)
+    # 生成文章 ID (分片、索引、增量统计均以此为键)
+    df = add_article_id(df)
     print("-" * 50) # 打印分隔线
     return df
 
@@ -66,17 +103,8 @@ def meida_clean(df, blacklist_keywords=config.BLACK_MEDIAS):
         print(f"黑名单清洗后剩余: {len(df)} 条 (共移除 {original_count - len(df)} 条)")
     # --- 3. 媒体来源合并与标准化 ---
     print("\n--- 正在进行媒体来源合并与标准化 ---")
-    # 建立映射字典 (比多行 loc 更易维护)
-    replacements = {
-        'Times of India': 'The Times of India',
-        'Economic Times': 'The Economic Times',
-        'India Today': 'India Today',
-        'Indian Express': 'Indian Express',
-        'Financial Express': 'Financial Express',
-        'BusinessLine': 'BusinessLine', # 这里把 BusinessLine Online 统一为 BusinessLine
-        'The Hindu': 'The Hindu'
-    }
-    for key, target in replacements.items():
+    # 映射字典见 MEDIA_REPLACEMENTS (比多行 loc 更易维护)
+    for key, target in MEDIA_REPLACEMENTS.items():
         # 将包含 key 的都改为 target
         df.loc[df['source_media'].str.contains(key, case=False, na=False), 'source_media'] = target
     # --- 4. 保存清洗后分布 ---
@@ -92,13 +120,168 @@ def meida_clean(df, blacklist_keywords=config.BLACK_MEDIAS):
     print("-" * 50)
     return df
 
+def _date_format(df):
+    """不带时区的发布时间固定写出格式 (带时区的保持 pandas 默认，保留时区偏移)"""
+    if 'publish_date' in df.columns and pd.api.types.is_datetime64_dtype(df['publish_date']):
+        return CSV_DATE_FORMAT
+    return None
+
 def data_save(df):
     print(f"清洗完成后数据总条数为{len(df)}")
     print(f"正在保存最终清洗数据到: {config.PROCESSED_DATA_DIR}")
     df.to_csv(
         config.PROCESSED_DATA_DIR / 'cleaned_data.csv', 
         index=False,          # 通常不保存pandas自动生成的数字索引
-        encoding='utf-8-sig'  # 使用 utf-8-sig 确保 Excel 打开中文不乱码
+        encoding='utf-8-sig', # 使用 utf-8-sig 确保 Excel 打开中文不乱码
+        date_format=_date_format(df)
     )
     print("数据保存完成。")
-    return None
\ No newline at end of file
+    return None
+
+# ============ 分块清洗 (语料大于内存时使用) ============
+
+def digest_array(df):
+    """标题+内容摘要 (与 article_id 相同) 的 uint64 数组"""
+    ids = [article_digest(t, c) for t, c in zip(df['title'], df['content'])]
+    return ids, np.frombuffer(bytes.fromhex(''.join(ids)), dtype='>u8').astype(np.uint64)
+
+class DigestSet:
+    """
+    紧凑的去重摘要集合：每篇文章只占 8 字节 (Python set 中每个元素约 70+ 字节)
+    由若干有序数组组成，新摘要追加为新数组，相邻数组规模接近时合并，查询用二分查找
+    """
+
+    def __init__(self, digests=None):
+        self.runs = [] if digests is None or len(digests) == 0 else [np.unique(digests)]
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def contains(self, digests):
+        found = np.zeros(len(digests), dtype=bool)
+        for run in self.runs:
+            pos = np.minimum(np.searchsorted(run, digests), len(run) - 1)
+            found |= run[pos] == digests
+        return found
+
+    def add_new(self, digests):
+        """加入一批摘要，返回 "首次出现" 的掩码 (批内重复只保留第一条，与 drop_duplicates 一致)"""
+        new = ~pd.Series(digests).duplicated().to_numpy() & ~self.contains(digests)
+        if new.any():
+            self.runs.append(np.sort(digests[new]))
+            while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+                last = self.runs.pop()
+                self.runs[-1] = np.sort(np.concatenate([self.runs[-1], last]))
+        return new
+
+    def save(self, path=DIGEST_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        merged = np.sort(np.concatenate(self.runs)) if self.runs else np.zeros(0, dtype=np.uint64)
+        np.save(path, merged)
+
+    @classmethod
+    def load(cls, path=DIGEST_PATH):
+        return cls(np.load(path)) if path.exists() else cls()
+
+def _add_counts(total, series):
+    """按首次出现顺序累计计数 (与整列 value_counts 的排序结果一致)"""
+    for key, count in series.value_counts(sort=False).items():
+        total[key] = total.get(key, 0) + count
+
+def _save_distribution(counts, path):
+    pd.Series(counts, dtype='int64').sort_values(ascending=False).to_csv(
+        path, sep='\t', header=['文章数量'], index_label='媒体来源', encoding='utf-8-sig'
+    )
+
+def _load_distribution(path):
+    if not path.exists():
+        return {}
+    table = pd.read_csv(path, sep='\t', encoding='utf-8-sig', keep_default_na=False)
+    return dict(zip(table['媒体来源'], table['文章数量']))
+
+def chunked_clean(
+    chunk_size=50000,
+    blacklist_keywords=config.BLACK_MEDIAS,
+    files=None,
+    append=False,
+    output_path=config.PROCESSED_DATA_DIR / 'cleaned_data.csv',
+    digest_path=DIGEST_PATH
+):
+    """
+    分块清洗：逐块完成 时间规范化 -> 删列 -> 重命名 -> 全局去重 -> 黑名单过滤 -> 媒体标准化，
+    逐块追加写出，内存占用只与块大小和去重摘要集合 (8 字节/篇) 有关
+    结果与 basic_clean + meida_clean + data_save 的整表流程一致 (行、顺序、取值及两张媒体分布表)
+    :param chunk_size: 每块行数
+    :param files: 要处理的 JSON 文件，默认为原始数据目录下全部文件
+    :param append: 增量模式，在已有的去重摘要、清洗结果与分布表基础上追加新文件
+    """
+    from src.data.load_and_check import iter_raw_data
+    from pandas.tseries.api import guess_datetime_format
+    print("-" * 50)
+    print(f"【分块清洗】块大小: {chunk_size}{'，增量追加' if append else ''}")
+    digests = DigestSet.load(digest_path) if append else DigestSet()
+    before_path = config.TABLES_DIR / '源数据媒体来源分布.csv'
+    after_path = config.TABLES_DIR / '清洗后媒体来源分布.csv'
+    counts_before = _load_distribution(before_path) if append else {}
+    counts_after = _load_distribution(after_path) if append else {}
+    removed = {keyword: 0 for keyword in blacklist_keywords or []}
+
+    columns = pd.read_csv(output_path, nrows=0, encoding='utf-8-sig').columns.tolist() if append else None
+    date_format = None
+    total = duplicated = written = 0
+    for chunk in iter_raw_data(chunk_size, files):
+        total += len(chunk)
+        # 1. 规范化时间：整列解析时 pandas 按第一个非空值推断格式，这里在首个块推断后固定下来
+        if date_format is None:
+            first = chunk['pub_date'].dropna()
+            if not first.empty and isinstance(first.iloc[0], str):
+                date_format = guess_datetime_format(first.iloc[0]) or False
+        chunk['publish_date'] = pd.to_datetime(chunk['pub_date'], format=date_format or None)
+        # 2. 删列与重命名 (个别文件缺少的列视为空列)
+        chunk = chunk.drop(columns=[c for c in DROP_COLUMNS if c in chunk.columns]).rename(columns=RENAME_COLUMNS)
+        if columns is None:
+            columns = chunk.columns.tolist() + ['article_id']
+        unknown = set(chunk.columns) - set(columns)
+        if unknown:
+            raise ValueError(f"后续文件出现首个文件中没有的列 {sorted(unknown)}，分块模式无法保证与整表结果一致")
+        # 3. 全局去重 (保留首次出现的行)
+        ids, array = digest_array(chunk)
+        keep = digests.add_new(array)
+        duplicated += int((~keep).sum())
+        chunk = chunk[keep].copy()
+        chunk['article_id'] = np.asarray(ids, dtype=object)[keep]
+        chunk = chunk.reindex(columns=columns)
+        _add_counts(counts_before, chunk['source_media'])
+        # 4. 黑名单过滤
+        for keyword in removed:
+            mask = chunk['source_media'].str.contains(keyword, case=False, na=False)
+            removed[keyword] += int(mask.sum())
+            chunk = chunk[~mask]
+        # 5. 媒体来源合并与标准化
+        for key, target in MEDIA_REPLACEMENTS.items():
+            chunk.loc[chunk['source_media'].str.contains(key, case=False, na=False), 'source_media'] = target
+        _add_counts(counts_after, chunk['source_media'])
+
+        first_write = written == 0 and not append
+        chunk.to_csv(
+            output_path,
+            mode='w' if first_write else 'a',
+            header=first_write,
+            index=False,
+            encoding='utf-8-sig' if first_write else 'utf-8',
+            date_format=_date_format(chunk)
+        )
+        written += len(chunk)
+        print(f" -> 已处理 {total} 行，累计写出 {written} 行，去重集合 {len(digests)} 条")
+
+    digests.save(digest_path)
+    _save_distribution(counts_before, before_path)
+    _save_distribution(counts_after, after_path)
+    print(f"输入 {total} 行，去除重复 {duplicated} 行")
+    for keyword, count in removed.items():
+        if count:
+            print(f" -> 剔除包含 '{keyword}' 的数据: {count} 条")
+    print(f"写出 {written} 行至: {output_path}")
+    print(f"媒体分布已保存至: tables/{before_path.name}, tables/{after_path.name}")
+    print("-" * 50)
+    return written
@@ -0,0 +1,280 @@
+"""
+实体索引：解析 Chinese_Entities / Indian_Entities，按别名表归一化实体名，
+维护 实体 -> 文章 的倒排索引与 中方实体 × 印方实体 的稀疏共现矩阵
+
+索引按 article_id 增量更新 (文章实体或标签变化时先撤销旧贡献再写入)，持久化为 pickle
+查询示例: 上个月 "中印经贸与科技" 议题中与 Adani 共同出现最多的中方实体
+    index = load_entity_index()
+    index.co_mentioned('Adani', category='中印经贸与科技', start='2025-11-01', end='2025-11-30')
+"""
+from src import config
+from src.data.analytics_cube import to_day
+import ast
+import json
+import pickle
+import re
+from collections import Counter
+import pandas as pd
+
+INDEX_PATH = config.PROCESSED_DATA_DIR / 'entity_index.pkl'
+# 分析人员可在此文件中补充别名 (两列: alias, canonical)
+ALIAS_FILE = config.EXTERNAL_DATA_DIR / 'entity_aliases.csv'
+
+SIDES = ('CN', 'IN')
+SIDE_COLUMNS = {'CN': 'Chinese_Entities', 'IN': 'Indian_Entities'}
+
+_SPACES = re.compile(r'\s+')
+_QUOTES = re.compile(r'^[\'"“”‘’\s]+|[\'"“”‘’\s.,;:]+$')
+_LEADING_THE = re.compile(r'^the\s+', re.IGNORECASE)
+
+def parse_entities(cell):
+    """把 CSV 中的列表字符串 (Python repr 或 JSON) 解析为名称列表"""
+    if isinstance(cell, (list, tuple, set)):
+        return [str(x) for x in cell if x]
+    if not isinstance(cell, str) or not cell.strip():
+        return []
+    text = cell.strip()
+    for loader in (ast.literal_eval, json.loads):
+        try:
+            value = loader(text)
+        except (ValueError, SyntaxError, json.JSONDecodeError):
+            continue
+        if isinstance(value, (list, tuple, set)):
+            return [str(x) for x in value if x]
+        if isinstance(value, str):
+            return [value] if value else []
+    # 兜底：按逗号分隔
+    return [part for part in (p.strip() for p in text.strip('[]').split(',')) if part]
+
+def normalize_key(name):
+    """归一化比较键：去引号/首尾标点、去掉开头的 the、合并空白、统一大小写"""
+    name = _QUOTES.sub('', str(name))
+    name = _LEADING_THE.sub('', name)
+    return _SPACES.sub(' ', name).strip().casefold()
+
+def load_aliases():
+    """合并 config.ENTITY_ALIASES 与外部别名文件，返回 {归一化别名: 标准名}"""
+    table = {}
+    for canonical, aliases in config.ENTITY_ALIASES.items():
+        for alias in [canonical, *aliases]:
+            table[normalize_key(alias)] = canonical
+    if ALIAS_FILE.exists():
+        extra = pd.read_csv(ALIAS_FILE)
+        for alias, canonical in zip(extra['alias'], extra['canonical']):
+            table[normalize_key(alias)] = canonical
+            table.setdefault(normalize_key(canonical), canonical)
+    return table
+
+class EntityIndex:
+    """实体倒排索引 + 稀疏共现矩阵"""
+
+    def __init__(self, aliases=None):
+        self.aliases = load_aliases() if aliases is None else aliases
+        # 未在别名表中的实体，以首次出现的写法作为展示名
+        self.display = {}
+        # article_id -> (日期, 分类, 媒体, 中方实体元组, 印方实体元组)
+        self.articles = {}
+        # article_id -> 同上，但实体为原始写法 (别名表变化时据此重建)
+        self.raw = {}
+        # (方, 实体) -> 文章 ID 集合
+        self.postings = {}
+        # (中方实体, 印方实体) -> 共现文章数
+        self.cooccurrence = Counter()
+
+    # ---------- 归一化 ----------
+
+    def canonical(self, name):
+        """实体的标准名 (只读，查询时使用，不改变索引)"""
+        key = normalize_key(name)
+        if not key:
+            return None
+        if key in self.aliases:
+            return self.aliases[key]
+        return self.display.get(key, _QUOTES.sub('', str(name)).strip())
+
+    def _register(self, name):
+        """写入索引时使用：未在别名表中的实体登记首次出现的写法"""
+        key = normalize_key(name)
+        if not key:
+            return None
+        if key in self.aliases:
+            return self.aliases[key]
+        return self.display.setdefault(key, _QUOTES.sub('', str(name)).strip())
+
+    def _canonical_set(self, names):
+        names = (self._register(n) for n in names)
+        return tuple(sorted({n for n in names if n}))
+
+    # ---------- 增量更新 ----------
+
+    def _remove(self, article_id):
+        _, _, _, cn, ind = self.articles.pop(article_id)
+        for side, names in (('CN', cn), ('IN', ind)):
+            for name in names:
+                ids = self.postings[(side, name)]
+                ids.discard(article_id)
+                if not ids:
+                    del self.postings[(side, name)]
+        for pair in ((c, i) for c in cn for i in ind):
+            self.cooccurrence[pair] -= 1
+            if self.cooccurrence[pair] <= 0:
+                del self.cooccurrence[pair]
+
+    def _add(self, article_id, record):
+        self.articles[article_id] = record
+        _, _, _, cn, ind = record
+        for side, names in (('CN', cn), ('IN', ind)):
+            for name in names:
+                self.postings.setdefault((side, name), set()).add(article_id)
+        self.cooccurrence.update((c, i) for c in cn for i in ind)
+
+    def update(self, df):
+        """用新标注的行更新索引，返回 (新增篇数, 变化篇数)"""
+        days = to_day(df['publish_date'])
+        added = changed = 0
+        columns = zip(df['article_id'].astype(str), days, df['category'], df['source_media'],
+                      df[SIDE_COLUMNS['CN']], df[SIDE_COLUMNS['IN']])
+        for article_id, day, category, media, cn_cell, in_cell in columns:
+            raw = (day, category, media, tuple(parse_entities(cn_cell)), tuple(parse_entities(in_cell)))
+            old = self.raw.get(article_id)
+            if old is not None:
+                if old == raw:
+                    continue
+                self._remove(article_id)
+                changed += 1
+            else:
+                added += 1
+            self._add_raw(article_id, raw)
+        return added, changed
+
+    def discard(self, article_ids):
+        """撤销指定文章的全部贡献，返回撤销的篇数"""
+        removed = 0
+        for article_id in map(str, article_ids):
+            if self.raw.pop(article_id, None) is not None:
+                self._remove(article_id)
+                removed += 1
+        return removed
+
+    def _add_raw(self, article_id, raw):
+        day, category, media, cn, ind = raw
+        self.raw[article_id] = raw
+        self._add(article_id, (day, category, media, self._canonical_set(cn), self._canonical_set(ind)))
+
+    def rebuild(self, aliases):
+        """按新的别名表重建整个索引"""
+        rebuilt = EntityIndex(aliases)
+        for article_id, raw in self.raw.items():
+            rebuilt._add_raw(article_id, raw)
+        return rebuilt
+
+    # ---------- 查询 ----------
+
+    def _filter(self, ids, category=None, source_media=None, start=None, end=None):
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        categories = [category] if isinstance(category, str) else category
+        medias = [source_media] if isinstance(source_media, str) else source_media
+        for article_id in ids:
+            day, cat, media, _, _ = self.articles[article_id]
+            if categories is not None and cat not in categories:
+                continue
+            if medias is not None and media not in medias:
+                continue
+            if start is not None and not day >= start:
+                continue
+            if end is not None and not day <= end:
+                continue
+            yield article_id
+
+    def articles_of(self, entity, side=None, **filters):
+        """包含该实体的文章 ID 列表 (side 为 None 时两方都查)"""
+        name = self.canonical(entity)
+        ids = set()
+        for s in (SIDES if side is None else (side,)):
+            ids |= self.postings.get((s, name), set())
+        return sorted(self._filter(ids, **filters))
+
+    def co_mentioned(self, entity, side=None, top=10, **filters):
+        """
+        与指定实体共同出现的另一方实体排名
+        :param side: 'CN' / 'IN'，实体所在方；None 时自动判断 (两方都出现时合并)
+        :param filters: category / source_media / start / end
+        """
+        name = self.canonical(entity)
+        counts = Counter()
+        for s in (SIDES if side is None else (side,)):
+            other = 1 if s == 'CN' else 0
+            for article_id in self._filter(self.postings.get((s, name), set()), **filters):
+                counts.update(n for n in self.articles[article_id][3 + other] if n != name)
+        result = pd.DataFrame(counts.most_common(top), columns=['entity', 'articles'])
+        result.insert(0, 'query', name)
+        return result
+
+    def top_entities(self, side='CN', top=15, **filters):
+        """某一方被提及文章数最多的实体"""
+        position = 3 if side == 'CN' else 4
+        counts = Counter()
+        for article_id in self._filter(self.articles.keys(), **filters):
+            counts.update(self.articles[article_id][position])
+        return pd.Series(dict(counts.most_common(top)), name='articles', dtype=int)
+
+    def cooccurrence_frame(self, min_count=1):
+        """全量共现矩阵的长表形式 (CN, IN, articles)，按共现数降序"""
+        rows = [(c, i, n) for (c, i), n in self.cooccurrence.items() if n >= min_count]
+        frame = pd.DataFrame(rows, columns=['CN', 'IN', 'articles'])
+        return frame.sort_values('articles', ascending=False, kind='stable').reset_index(drop=True)
+
+    def cooccurrence_matrix(self, min_count=1):
+        """
+        稀疏共现矩阵：直接由 (中方实体, 印方实体, 共现数) 三元组构造，只保存非零单元
+        :return: Sparse[int] Series，索引为 (CN, IN) 两级 MultiIndex
+        """
+        pairs = [(c, i, n) for (c, i), n in self.cooccurrence.items() if n >= min_count]
+        cn, ind, counts = zip(*pairs) if pairs else ((), (), ())
+        index = pd.MultiIndex.from_arrays([list(cn), list(ind)], names=['CN', 'IN'])
+        return pd.Series(list(counts), index=index, dtype=pd.SparseDtype(int, 0), name='articles')
+
+def load_entity_index(path=INDEX_PATH):
+    """读取已保存的索引 (别名表按当前配置重新加载)，不存在时返回空索引"""
+    if not path.exists():
+        return EntityIndex()
+    with open(path, 'rb') as f:
+        index = pickle.load(f)
+    aliases = load_aliases()
+    if aliases != index.aliases:
+        print("⚠️ 别名表已变化，正在按新别名表重建实体索引...")
+        return index.rebuild(aliases)
+    return index
+
+def save_entity_index(index, path=INDEX_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def update_entity_index(df, path=INDEX_PATH):
+    """增量更新并保存实体索引"""
+    print("-" * 50)
+    print("【更新实体索引】")
+    if 'article_id' not in df.columns:
+        from src.data.data_clean import add_article_id
+        df = add_article_id(df.copy())
+    index = load_entity_index(path)
+    added, changed = index.update(df)
+    print(f"新增 {added} 篇，变化 {changed} 篇；索引共 {len(index.articles)} 篇文章、"
+          f"{len(index.postings)} 个实体、{len(index.cooccurrence)} 个共现对")
+    if added or changed:
+        save_entity_index(index, path)
+        print(f"已保存至: {path}")
+    print("-" * 50)
+    return index
+
+def remove_from_entity_index(article_ids, path=INDEX_PATH):
+    """从已保存的索引中撤销指定文章，返回撤销的篇数"""
+    if not path.exists():
+        return 0
+    index = load_entity_index(path)
+    removed = index.discard(article_ids)
+    if removed:
+        save_entity_index(index, path)
+    return removed
@@ -0,0 +1,368 @@
+"""
+分层 map-reduce 报告生成器
+
+1. map: 按 (分类, 日期) 把 Summary_CN 切成不超过 token 预算的批次，每批生成一份局部简报
+2. reduce: 同一分类的局部简报按预算分组逐层合并，直到得到该分类的整体简报
+3. overview: 汇总各分类简报与统计数据，生成核心研判、研判建议与异常信号
+4. 套用 prompt/生成报告.md 的 LaTeX 模板输出 .tex
+
+每次调用的结果按 "prompt + 模型 + 输入内容" 的哈希缓存，新增一天数据后只有
+该日期的 map 批次、受影响分类的 reduce 链路以及 overview 会重新调用模型
+"""
+from src import config
+from src.data.preprocess import count_tokens
+from src.data.analytics_cube import CUBE_KEYS, cube_members, load_cube, query_cube, to_day
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+import pandas as pd
+from tqdm import tqdm
+from openai import OpenAI, BadRequestError, RateLimitError, APITimeoutError, APIConnectionError
+
+CACHE_DIR = config.INTERIM_DATA_DIR / 'report_cache'
+TEMPLATE_PATH = config.PROMPT_DIR / '生成报告.md'
+STYLE_NOTES_PATH = config.PROMPT_DIR / '注意事项.md'
+
+# 报告正文中的议题 (不含 "其他")
+REPORT_CATEGORIES = [c for c in config.VALID_CATEGORIES if c != "其他"]
+
+def clean_json_string(text):
+    """清洗 JSON 字符串"""
+    start = text.find('{')
+    end = text.rfind('}')
+    if start != -1 and end != -1:
+        text = text[start : end + 1]
+    return text
+
+def call_llm_report(system_prompt, user_content, retries=5):
+    """
+    调用模型完成一次 map / reduce / overview，返回解析后的 JSON
+    """
+    client = OpenAI(
+        api_key=config.API_KEY,
+        base_url=config.API_URL
+    )
+
+    for attempt in range(retries):
+        try:
+            response = client.chat.completions.create(
+                model=config.MODEL_NAME,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_content}
+                ],
+                temperature=0.3,
+                response_format={"type": "json_object"},
+                timeout=300,
+                stream=False
+            )
+
+            if response.choices[0].finish_reason == "content_filter":
+                print(f"⚠️ 内容安全拦截: {user_content[:30]}...")
+                return None
+
+            return json.loads(clean_json_string(response.choices[0].message.content))
+
+        except BadRequestError as e:
+            print(f"❌ 请求被拒绝 (BadRequest): {e}")
+            return None
+
+        except RateLimitError:
+            sleep_time = 5 * (attempt + 1)
+            print(f"⚠️ 429 限流, 等待 {sleep_time}s...")
+            time.sleep(sleep_time)
+
+        except (APITimeoutError, APIConnectionError) as e:
+            print(f"⚠️ 网络/超时问题: {e}, 重试中...")
+            time.sleep(2)
+
+        except json.JSONDecodeError:
+            print("❌ JSON 解析失败，可能是模型输出格式错误。重试中...")
+
+        except Exception as e:
+            print(f"❌ 未知异常: {e}")
+            time.sleep(2)
+
+    return None
+
+# ============ 缓存 ============
+
+def _style_notes():
+    """编辑注意事项 (附加到每个 prompt 末尾)"""
+    if not STYLE_NOTES_PATH.exists():
+        return ""
+    return "\n# Editorial Rules (必须遵守)\n" + STYLE_NOTES_PATH.read_text(encoding='utf-8')
+
+# map 阶段多个线程同时更新调用统计
+_STATS_LOCK = threading.Lock()
+
+def cache_key(system_prompt, user_content):
+    h = hashlib.sha256()
+    for part in (config.MODEL_NAME, system_prompt, user_content):
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\x1f')
+    return h.hexdigest()
+
+def cached_call(system_prompt, user_content, stats):
+    """带缓存的模型调用；失败结果不写缓存，下次会重试"""
+    system_prompt = system_prompt + _style_notes()
+    path = CACHE_DIR / f"{cache_key(system_prompt, user_content)}.json"
+    if path.exists():
+        with _STATS_LOCK:
+            stats['cached'] += 1
+        return json.loads(path.read_text(encoding='utf-8'))
+    result = call_llm_report(system_prompt, user_content)
+    with _STATS_LOCK:
+        stats['called'] += 1
+    if result is not None:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(result, ensure_ascii=False), encoding='utf-8')
+    return result
+
+# ============ map-reduce ============
+
+def _pack(items, budget):
+    """按顺序把文本打包成若干批次，每批不超过 token 预算 (单条超预算时单独成批)"""
+    batches, current, used = [], [], 0
+    for item in items:
+        tokens = count_tokens(item)
+        if current and used + tokens > budget:
+            batches.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def _summary_line(row):
+    return f"[{row['day']:%Y-%m-%d}] 《{row['source_media']}》 ({row['Sentiment_Score']}) {row['Summary_CN']}"
+
+def map_partials(df, max_workers=8, stats=None):
+    """
+    map 阶段：按 (分类, 日期) 生成局部简报
+    :return: {分类: [(日期, 局部简报), ...]}
+    """
+    df = df.assign(day=to_day(df['publish_date'])).sort_values(['category', 'day', 'article_id'])
+    jobs = []
+    for (category, day), group in df.groupby(['category', 'day'], sort=True):
+        lines = [_summary_line(row) for _, row in group.iterrows()]
+        for batch in _pack(lines, config.REPORT_MAP_TOKEN_BUDGET):
+            jobs.append((category, day, "\n".join(batch)))
+    print(f"map 阶段: {len(jobs)} 个批次")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(tqdm(
+            executor.map(lambda job: cached_call(config.REPORT_MAP_PROMPT, job[2], stats), jobs),
+            total=len(jobs),
+            desc="🗺️ Map"
+        ))
+
+    partials = {}
+    for (category, day, _), result in zip(jobs, results):
+        if result is not None:
+            partials.setdefault(category, []).append((day, result))
+    return partials
+
+def reduce_partials(partials, stats):
+    """
+    reduce 阶段：按预算分组逐层合并，直到只剩一份
+    分组只依赖局部简报的顺序与内容，未变化的分组会命中缓存
+    """
+    texts = [json.dumps(p, ensure_ascii=False) for p in partials]
+    while len(texts) > 1:
+        groups = _pack(texts, config.REPORT_REDUCE_TOKEN_BUDGET)
+        if len(groups) == len(texts):
+            # 每份都已超出预算，两两合并以保证收敛
+            groups = [texts[i:i + 2] for i in range(0, len(texts), 2)]
+        merged = []
+        for group in groups:
+            if len(group) == 1:
+                merged.append(group[0])
+                continue
+            result = cached_call(config.REPORT_REDUCE_PROMPT, "[\n" + ",\n".join(group) + "\n]", stats)
+            if result is not None:
+                merged.append(json.dumps(result, ensure_ascii=False))
+        texts = merged
+    return json.loads(texts[0]) if texts else None
+
+def category_stats(df, start, end):
+    """各议题的文章数、占比与平均情感 (优先读取分析立方体，立方体未覆盖时按 df 现算)"""
+    stats = query_cube(by=('category',), start=start, end=end, cube=load_cube()).set_index('category')
+    if not set(df['category']).issubset(stats.index):
+        cube = cube_members(df).groupby(CUBE_KEYS).size().rename('count').reset_index()
+        stats = query_cube(by=('category',), start=start, end=end, cube=cube).set_index('category')
+    stats['share'] = stats['count'] / stats['count'].sum() * 100
+    return stats
+
+# ============ LaTeX 输出 ============
+
+LATEX_SPECIAL = {'\\': r'\textbackslash{}', '%': r'\%', '&': r'\&', '$': r'\$', '#': r'\#',
+                 '_': r'\_', '{': r'\{', '}': r'\}', '~': r'\textasciitilde{}', '^': r'\textasciicircum{}'}
+
+def tex(text):
+    """转义 LaTeX 特殊字符"""
+    return ''.join(LATEX_SPECIAL.get(ch, ch) for ch in str(text or ''))
+
+def _preamble():
+    """模板中 \\documentclass 到 \\begin{document} 的导言区"""
+    template = TEMPLATE_PATH.read_text(encoding='utf-8')
+    start = template.index(r'\documentclass')
+    end = template.index(r'\begin{document}') + len(r'\begin{document}')
+    return template[start:end]
+
+def chinese_numeral(n):
+    """1-99 的中文数字 (十一、二十、九十九)，超出范围时返回阿拉伯数字"""
+    digits = "零一二三四五六七八九"
+    if not 1 <= n <= 99:
+        return str(n)
+    tens, ones = divmod(n, 10)
+    if tens == 0:
+        return digits[ones]
+    return (digits[tens] if tens > 1 else "") + "十" + (digits[ones] if ones else "")
+
+def render_latex(overview, sections, stats, start, end, issue, figures):
+    lines = [_preamble(), "", r"\begin{titlepage}", r"    \centering", r"    \vspace*{3cm}",
+             r"    \textcolor{MainColor}{\rule{\textwidth}{2pt}}", r"    \vspace{1cm}",
+             r"    {\fangsong \bfseries \erhao 印媒动态追踪 \par}", r"    \vspace{2cm}",
+             rf"    {{\fangsong \sanhao \textbf{{第 {issue} 期}} \par}}", r"    \vspace{0.5cm}",
+             rf"    {{\fangsong \sanhao （本期追踪时间：{start:%Y.%m.%d} - {end:%Y.%m.%d}） \par}}",
+             r"    \vfill", r"    {\fangsong \sanhao \textbf{数据来源：Factiva 全球新闻数据库} \par}",
+             r"    \vspace{0.5cm}", rf"    {{\fangsong \sanhao \textbf{{{pd.Timestamp.today():%Y年%m月%d日}}} \par}}",
+             r"\end{titlepage}", "", r"\fangsong \sanhao", ""]
+
+    # 第一部分：核心研判
+    lines += [r"\section{本期印媒动态概览}", "",
+              rf"\begin{{summarybox}}[{tex(overview.get('box_title', '总体态势'))}]",
+              r"    \begin{itemize}[leftmargin=*]",
+              rf"        \item \textbf{{核心焦点：}} {tex(overview.get('focus'))}",
+              rf"        \item \textbf{{风险预警：}} {tex(overview.get('risk'))}",
+              r"    \end{itemize}", r"\end{summarybox}", "",
+              r"\vspace{0.8cm}", r"\noindent \textbf{【研判建议】}", "",
+              rf"\textbf{{1. 战略层面：}} {tex(overview.get('strategic'))}", "",
+              rf"\textbf{{2. 经贸层面：}} {tex(overview.get('economic'))}", "",
+              r"\textbf{3. 应对建议：}", r"\vspace{-0.7em}", r"\begin{itemize}"]
+    lines += [rf"    \item \textbf{{{tex(r.get('title'))}：}} {tex(r.get('text'))}" for r in overview.get('recommendations', [])]
+    lines += [r"\end{itemize}", ""]
+
+    # 第二部分：热点议题剖析
+    lines += [r"\section{本期热点议题剖析}", ""]
+    for i, (category, section) in enumerate(sections.items()):
+        row = stats.loc[category]
+        number = chinese_numeral(i + 1)
+        lines += ["% " + "-" * 59, rf"\subsection{{议题{number}：{tex(category)}}}",
+                  rf"\textbf{{【情感得分：{row['mean_sentiment']:.2f} | 文章数：{int(row['count'])}篇】}}", "",
+                  r"\noindent \textbf{主要叙事：}", tex(section.get('narrative')), ""]
+        for event in section.get('key_events', []):
+            lines += [r"\vspace{0.5cm}", rf"\noindent \textbf{{【{tex(event.get('title'))}】}}",
+                      f"{tex(event.get('media'))}{tex(event.get('date'))}报道，{tex(event.get('summary'))}", ""]
+
+    # 第三部分：异常信号
+    lines += [r"\section{异常与微弱信号}", "", r"\begin{itemize}[leftmargin=*]"]
+    for signal in overview.get('signals', []):
+        lines += [rf"    \item \textbf{{【{tex(signal.get('title'))}】}}", f"    {tex(signal.get('text'))}", ""]
+    lines += [r"\end{itemize}", ""]
+
+    # 第四部分：舆情可视化 (只引用已生成的图)
+    if figures:
+        lines += [r"\section{本期舆情可视化}", ""]
+        for path, caption in figures:
+            lines += [r"\begin{figure}[H]", r"    \centering",
+                      rf"    \includegraphics[width=1\linewidth]{{{path.as_posix()}}}",
+                      rf"    \caption{{{tex(caption)}}}", r"\end{figure}", ""]
+    lines.append(r"\end{document}")
+    return "\n".join(lines)
+
+# ============ 主入口 ============
+
+REPORT_FIGURES = [
+    ('01_议题分布占比图.png', '核心议题关注度分布 (占比 %)'),
+    ('02_情感倾向雷达图.png', '主要议题情感倾向雷达图 (平均分)'),
+    ('03_实体词频统计图.png', '本期印媒最关注的中方实体'),
+]
+
+def generate_report(df=None, start=None, end=None, issue=1, max_workers=8, output_path=None):
+    """
+    生成一期报告
+    :param df: 总结后的数据 (默认读取 result_data.csv)
+    :param start / end: 追踪时间范围 (闭区间)，默认取数据中最后 7 天
+    :param issue: 期数
+    :return: 生成的 .tex 文件路径
+    """
+    print("-" * 50)
+    print("【生成报告】")
+    if df is None:
+        df = pd.read_csv(config.PROCESSED_DATA_DIR / 'result_data.csv')
+    if 'article_id' not in df.columns:
+        from src.data.data_clean import add_article_id
+        df = add_article_id(df.copy())
+    day = to_day(df['publish_date'])
+    end = pd.Timestamp(end) if end is not None else day.max()
+    start = pd.Timestamp(start) if start is not None else end - pd.Timedelta(days=6)
+
+    summary = df['Summary_CN']
+    mask = (
+        day.between(start, end)
+        & df['category'].isin(REPORT_CATEGORIES)
+        & summary.notna() & (summary != "") & (summary != "Error")
+    )
+    df = df[mask]
+    print(f"追踪时间: {start:%Y-%m-%d} ~ {end:%Y-%m-%d}，纳入文章 {len(df)} 篇")
+    if df.empty:
+        raise ValueError("所选时间范围内没有可用于生成报告的数据")
+
+    call_stats = {'called': 0, 'cached': 0}
+    partials = map_partials(df, max_workers=max_workers, stats=call_stats)
+
+    sections = {}
+    for category in REPORT_CATEGORIES:
+        if category in partials:
+            section = reduce_partials([p for _, p in partials[category]], call_stats)
+            if section is not None:
+                sections[category] = section
+    print(f"reduce 阶段: 完成 {len(sections)} 个议题")
+
+    stats = category_stats(df, start, end)
+    overview_input = [
+        {
+            'category': category,
+            'count': int(stats.loc[category, 'count']),
+            'share': f"{stats.loc[category, 'share']:.1f}%",
+            'mean_sentiment': round(float(stats.loc[category, 'mean_sentiment']), 2),
+            'brief': section,
+        }
+        for category, section in sections.items()
+    ]
+    overview = cached_call(config.REPORT_OVERVIEW_PROMPT, json.dumps(overview_input, ensure_ascii=False, indent=1), call_stats) or {}
+
+    config.REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    output_path = output_path or config.REPORTS_DIR / f"印媒动态追踪_第{issue}期_{end:%Y%m%d}.tex"
+    # 图片以相对 .tex 文件的路径引用
+    figures = [
+        (Path(os.path.relpath(config.FIGURES_DIR / name, output_path.parent)), caption)
+        for name, caption in REPORT_FIGURES
+        if (config.FIGURES_DIR / name).exists()
+    ]
+    output_path.write_text(render_latex(overview, sections, stats, start, end, issue, figures), encoding='utf-8')
+
+    print(f"模型调用 {call_stats['called']} 次，命中缓存 {call_stats['cached']} 次")
+    print(f"报告已保存至: {output_path}")
+    print("-" * 50)
+    return output_path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="map-reduce 生成印媒动态追踪报告")
+    parser.add_argument('--start', default=None)
+    parser.add_argument('--end', default=None)
+    parser.add_argument('--issue', type=int, default=1)
+    parser.add_argument('--max-workers', type=int, default=8)
+    args = parser.parse_args(argv)
+    generate_report(start=args.start, end=args.end, issue=args.issue, max_workers=args.max_workers)
+
+if __name__ == '__main__':
+    main()
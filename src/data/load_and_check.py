@@ -17,21 +17,10 @@ def load_raw_data():
 
     # 循环读取每个文件
     for i, file_path in enumerate(json_files, 1):
-        try:
-            print(f"[{i}/{len(json_files)}] 正在读取: {file_path.name}")
-            # 读取单个 JSON
-            temp_df = pd.read_json(file_path)
-            
-            # 保留你原有的逻辑：展开 articles 字段
-            # 注意：如果某个文件是空的或结构不对，这里可能会报错，建议加上 try-except
-            if 'articles' in temp_df.columns:
-                temp_df = temp_df['articles'].apply(pd.Series)
-                dfs.append(temp_df)
-            else:
-                print(f"警告: 文件 {file_path.name} 中不包含 'articles' 字段，已跳过。")
-                
-        except Exception as e:
-            print(f"错误: 读取文件 {file_path.name} 失败. 原因: {e}")
+        print(f"[{i}/{len(json_files)}] 正在读取: {file_path.name}")
+        temp_df = read_raw_file(file_path)
+        if temp_df is not None:
+            dfs.append(temp_df)
 
     # 合并所有数据
     final_df = pd.concat(dfs, ignore_index=True)
@@ -39,6 +28,37 @@ def load_raw_data():
 
     return final_df
 
+def read_raw_file(file_path):
+    """读取单个 JSON 文件并展开 articles 字段，失败或结构不对时返回 None"""
+    try:
+        # 读取单个 JSON
+        temp_df = pd.read_json(file_path)
+
+        # 保留你原有的逻辑：展开 articles 字段
+        if 'articles' in temp_df.columns:
+            return temp_df['articles'].apply(pd.Series)
+        print(f"警告: 文件 {file_path.name} 中不包含 'articles' 字段，已跳过。")
+    except Exception as e:
+        print(f"错误: 读取文件 {file_path.name} 失败. 原因: {e}")
+    return None
+
+def iter_raw_data(chunk_size=50000, files=None):
+    """
+    按文件顺序逐块产出原始数据 (每次只有一个文件在内存中)
+    拼接所有块即为 load_raw_data 的结果
+    :param files: 要读取的 JSON 文件列表，默认为原始数据目录下全部文件
+    """
+    from src import config
+    json_files = sorted(config.RAW_DATA_DIR.glob('*.json')) if files is None else list(files)
+    print(f"共 {len(json_files)} 个 JSON 文件，按每块 {chunk_size} 行分块读取")
+    for i, file_path in enumerate(json_files, 1):
+        print(f"[{i}/{len(json_files)}] 正在读取: {file_path.name}")
+        temp_df = read_raw_file(file_path)
+        if temp_df is None:
+            continue
+        for start in range(0, len(temp_df), chunk_size):
+            yield temp_df.iloc[start:start + chunk_size].reset_index(drop=True)
+
 def check_data(df):
     """
     详细检查 DataFrame 的缺失值情况，返回统计表
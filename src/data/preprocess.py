@@ -0,0 +1,242 @@
+import re
+import json
+import math
+import hashlib
+import pandas as pd
+from src import config
+
+# ============ 样板文本规则 ============
+# 通用规则：对所有媒体生效，逐行匹配 (区分大小写)，命中的整行删除
+# 规则只匹配较短的独立行 (行长上限约 120 字符)，避免整篇只有一行的文章被整体删除
+COMMON_BOILERPLATE_RULES = [
+    # 署名 / 发布时间行
+    r'^[ \t]*(By|BY|Written by|Edited by|Reported by)[ \t]+[A-Z][\w.\'-]*([ \t]+[A-Z][\w.\'-]*){0,3}([ \t]*(,|and|&)[ \t]*[A-Z][\w.\'-]*([ \t]+[A-Z][\w.\'-]*){0,3})*[ \t]*$',
+    r'^[ \t]*(Updated|Published|Last Updated|First Published)[ \t]*(on|:)?[ \t]*[\w \t,:.|-]{0,60}(IST|GMT|AM|PM|\d{4})[ \t]*$',
+    r'^[ \t]*\(?[ \t]*(With|with) inputs from [\w \t,&]+\)?[ \t]*\.?[ \t]*$',
+    # "Also Read" 类推荐链接
+    r'^[ \t]*(Also Read|Also read|ALSO READ|Read More|Read more|READ MORE|Read Also|Must Read|Recommended Stories)\b[^\n]{0,120}$',
+    # 图片说明
+    r'^[ \t]*[\(\[]?[ \t]*(Photo|Image|Picture|File Photo|File photo|Representative Image|Representational Image|Representative image|Representational image)[ \t]*(:|\||credit|courtesy|by)[^\n]{0,120}$',
+    r'^[ \t]*[\(\[][ \t]*(Photo|Image|File|Representational|Representative)[^\)\]\n]{0,150}[\)\]][ \t]*$',
+    # 订阅 / 关注 / 下载 App 的页脚
+    r'^[ \t]*(Subscribe to|Download the|Follow us on|Click here to|Join our|Sign up for)\b[^\n]{0,120}$',
+    r'^[ \t]*Catch all the [^\n]{0,80}(News|Updates)[^\n]{0,80}$',
+    r'^[ \t]*\(?You can now subscribe to our [^\n]{0,120}$',
+    # 版权声明
+    r'^[ \t]*(©|\([cC]\)|Copyright[ \t]*(©|\([cC]\))?[ \t]*\d{4})[^\n]{0,120}$',
+    r'^[^\n]{0,120}All [Rr]ights [Rr]eserved\.?[ \t]*$',
+    # Factiva 文档编号
+    r'^[ \t]*Document [A-Za-z0-9]{20,}[ \t]*$',
+]
+
+# 媒体专属规则：键为标准化后的 source_media
+MEDIA_BOILERPLATE_RULES = {
+    'Business Standard': [
+        r'^[ \t]*\(Only the headline and picture of this report may have been reworked by the Business Standard staff[^\n]{0,120}$',
+    ],
+    'NDTV': [
+        r'^[ \t]*\(Except for the headline, this story has not been edited by NDTV staff[^\n]{0,120}$',
+    ],
+    'Mint': [
+        r'^[ \t]*Catch all the Business News, Market News[^\n]{0,120}$',
+    ],
+    'Hindustan Times': [
+        r'^[ \t]*Get Latest India News[^\n]{0,120}$',
+    ],
+    'The Economic Times': [
+        r'^[ \t]*\(What\'s moving Sensex and Nifty[^\n]{0,120}$',
+        r'^[ \t]*\(You can now subscribe to our Economic Times WhatsApp channel\)[ \t]*$',
+    ],
+    'The Times of India': [
+        r'^[ \t]*\(This article is part of [^\n]{0,80} series\)[ \t]*$',
+    ],
+}
+
+# 每条规则连同行尾换行一起删除，避免留下空行
+_COMMON_PATTERNS = [re.compile(p + r'\n?', re.MULTILINE) for p in COMMON_BOILERPLATE_RULES]
+_MEDIA_PATTERNS = {
+    media: [re.compile(p + r'\n?', re.MULTILINE) for p in patterns]
+    for media, patterns in MEDIA_BOILERPLATE_RULES.items()
+}
+_BLANK_LINES = re.compile(r'\n[ \t]*\n(\s*\n)+')
+
+# 本地 token 估算：中文按字、英文按约 4 字符一个 token、标点各一个
+_TOKEN_PATTERN = re.compile(r'[\u4e00-\u9fff]|[A-Za-z]+|\d+|[^\sA-Za-z\d\u4e00-\u9fff]')
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?。！？])\s+')
+
+# 去样板后剩余长度低于原文的该比例 (或为空) 时视为误删，保留原文
+MIN_KEEP_RATIO = 0.5
+
+# 预处理 token 统计 (每次调用追加一行)
+STATS_PATH = config.TABLES_DIR / '预处理token统计.csv'
+
+# 截断后插入的省略标记
+ELLIPSIS_MARK = "\n[...]\n"
+
+# 各阶段使用的系统提示词 (config 中的属性名)
+STAGE_PROMPTS = {'classify': 'SYSTEM_PROMPT_01', 'summarize': 'SYSTEM_PROMPT_02'}
+
+
+def count_tokens(text):
+    """本地估算文本 token 数 (近似值，用于预算与统计，不调用任何接口)"""
+    if not isinstance(text, str) or not text:
+        return 0
+    total = 0
+    for token in _TOKEN_PATTERN.findall(text):
+        if token[0].isalpha() and token.isascii():
+            total += math.ceil(len(token) / 4)
+        else:
+            total += 1
+    return total
+
+
+def strip_boilerplate(text, media=None):
+    """删除署名、Also Read 链接、图片说明、订阅页脚、版权声明等样板文本"""
+    if not isinstance(text, str):
+        return text
+    original = text
+    for pattern in _COMMON_PATTERNS:
+        text = pattern.sub('', text)
+    for pattern in _MEDIA_PATTERNS.get(media, []):
+        text = pattern.sub('', text)
+    # 合并连续空行
+    text = _BLANK_LINES.sub('\n\n', text).strip()
+    if len(text) < len(original.strip()) * MIN_KEEP_RATIO:
+        return original.strip()
+    return text
+
+
+def _split_units(text):
+    """按段落切分；只有一段时退化为按句切分"""
+    units = [p.strip() for p in text.split('\n') if p.strip()]
+    if len(units) <= 1:
+        units = [s for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+    return units
+
+
+def _cut_to_tokens(text, budget, from_end=False):
+    """把单个过长段落按 token 比例截到预算内"""
+    tokens = count_tokens(text)
+    if tokens <= budget:
+        return text
+    keep = max(1, int(len(text) * budget / tokens))
+    return text[-keep:] if from_end else text[:keep]
+
+
+def fit_to_budget(text, budget, lead_ratio=0.7):
+    """
+    按 token 预算截取 "导语 + 结尾" 窗口
+    与 SYSTEM_PROMPT_02 "优先依据标题与结尾段判断" 的规则一致：
+    先从开头取 lead_ratio 的预算，剩余预算从结尾倒序取段落，中间用省略标记连接
+    """
+    if not isinstance(text, str) or budget is None or count_tokens(text) <= budget:
+        return text
+    units = _split_units(text)
+    lead_budget = int(budget * lead_ratio)
+    lead, lead_tokens = [], 0
+    for unit in units:
+        unit_tokens = count_tokens(unit)
+        if lead_tokens + unit_tokens > lead_budget:
+            if not lead:
+                lead.append(_cut_to_tokens(unit, lead_budget))
+                lead_tokens = lead_budget
+            break
+        lead.append(unit)
+        lead_tokens += unit_tokens
+    tail_budget = budget - lead_tokens
+    tail, tail_tokens = [], 0
+    for unit in reversed(units[len(lead):]):
+        unit_tokens = count_tokens(unit)
+        if tail_tokens + unit_tokens > tail_budget:
+            if not tail and tail_budget > 0:
+                tail.append(_cut_to_tokens(unit, tail_budget, from_end=True))
+            break
+        tail.insert(0, unit)
+        tail_tokens += unit_tokens
+    if not tail:
+        return '\n'.join(lead)
+    return '\n'.join(lead) + ELLIPSIS_MARK + '\n'.join(tail)
+
+
+def preprocess_content(content, budget=None, media=None):
+    """
+    单篇文章预处理：去样板文本 + 按预算截取
+    返回 (处理后文本, 原始 token 数, 去样板后 token 数, 最终 token 数)
+    """
+    tokens_raw = count_tokens(content)
+    text = strip_boilerplate(content, media)
+    tokens_clean = count_tokens(text)
+    text = fit_to_budget(text, budget)
+    return text, tokens_raw, tokens_clean, count_tokens(text)
+
+
+def prompt_version(stage, preprocess=False):
+    """
+    模型输入的版本号：系统提示词 + 预处理设置 (样板规则、阶段预算、截取方式) 的哈希
+    不做预处理时只对提示词取哈希，与历史标签的版本号保持一致
+    """
+    text = getattr(config, STAGE_PROMPTS[stage])
+    if preprocess:
+        settings = [COMMON_BOILERPLATE_RULES, MEDIA_BOILERPLATE_RULES, MIN_KEEP_RATIO,
+                    config.TOKEN_BUDGETS.get(stage), ELLIPSIS_MARK]
+        text += '\x1f' + json.dumps(settings, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+
+
+def append_stats(stats, stats_path=STATS_PATH):
+    """追加统计行 (新文件带表头与 BOM，追加时不重复写入)"""
+    stats_path.parent.mkdir(parents=True, exist_ok=True)
+    is_new = not stats_path.exists()
+    stats.to_csv(
+        stats_path,
+        mode='a',
+        header=is_new,
+        index=False,
+        encoding='utf-8-sig' if is_new else 'utf-8'
+    )
+
+def preprocess_articles(df, stage='classify', budget=None, save_stats=True, stats_path=None):
+    """
+    对整表 content 做预处理，返回与 df 同索引的处理后 content (不修改 df 本身)
+    :param stage: 调用阶段，用于从 config.TOKEN_BUDGETS 读取默认预算，例如 'classify' / 'summarize'
+    :param budget: (可选) 覆盖默认预算，None 则使用 config 中的阶段预算
+    :param stats_path: (可选) 统计写入路径，默认 STATS_PATH；多进程并行时各进程应写独立文件
+    """
+    if budget is None:
+        budget = config.TOKEN_BUDGETS.get(stage)
+    media = df['source_media'] if 'source_media' in df.columns else pd.Series(None, index=df.index)
+
+    results = [
+        preprocess_content(content, budget, m)
+        for content, m in zip(df['content'], media)
+    ]
+    processed = pd.Series([r[0] for r in results], index=df.index, dtype=object)
+    tokens_raw = sum(r[1] for r in results)
+    tokens_clean = sum(r[2] for r in results)
+    tokens_final = sum(r[3] for r in results)
+    truncated = sum(1 for r in results if r[3] < r[2])
+
+    print("-" * 50)
+    print(f"【文章预处理】阶段: {stage}，单篇预算: {budget} tokens")
+    print(f"  - 处理文章数: {len(results)} 条，其中按预算截取: {truncated} 条")
+    print(f"  - 原始 token: {tokens_raw}")
+    print(f"  - 去样板后 token: {tokens_clean} (节省 {tokens_raw - tokens_clean})")
+    print(f"  - 截取后 token: {tokens_final} (合计节省 {tokens_raw - tokens_final}, "
+          f"{(tokens_raw - tokens_final) / max(tokens_raw, 1):.1%})")
+
+    if save_stats:
+        stats = pd.DataFrame([{
+            '阶段': stage,
+            '单篇预算': budget,
+            '文章数': len(results),
+            '截取文章数': truncated,
+            '原始token': tokens_raw,
+            '去样板后token': tokens_clean,
+            '最终token': tokens_final,
+            '节省token': tokens_raw - tokens_final,
+        }])
+        stats_path = stats_path or STATS_PATH
+        append_stats(stats, stats_path)
+        print(f"预处理统计已追加至: {stats_path}")
+    print("-" * 50)
+    return processed
@@ -0,0 +1,337 @@
+"""
+全文检索索引：基于 SQLite FTS5，对 标题 / 正文 / 中文摘要 / 英文摘要 建立倒排索引，
+并与 分类、媒体、日期、情感得分 元数据表关联，支持过滤、按 bm25 排序与分页
+
+- 英文按 unicode61 分词并做 porter 词干化；中文逐字切分后入库，查询时中文词转为短语查询
+- 索引按 article_id 增量更新：每行计算内容指纹，只重写新增或内容/标签发生变化的文章
+查询示例:
+    hits = search('Adani 港口', category='中印经贸与科技', start='2025-11-01', page=1)
+    hits.attrs['total']  # 命中总数
+"""
+from src import config
+from src.data.analytics_cube import to_day, VALID_SCORES
+import argparse
+import re
+import sqlite3
+import time
+import pandas as pd
+
+INDEX_DB_PATH = config.PROCESSED_DATA_DIR / 'search_index.db'
+
+# FTS 列与源数据列的对应关系 (顺序即 bm25 权重顺序)
+TEXT_COLUMNS = {
+    'title': 'title',
+    'content': 'content',
+    'summary_cn': 'Summary_CN',
+    'summary_en': 'Summary_EN',
+}
+# 标题命中的权重最高，摘要次之，正文最低
+BM25_WEIGHTS = (8.0, 1.0, 3.0, 3.0)
+
+RESULT_COLUMNS = ['article_id', 'title', 'publish_date', 'source_media', 'category', 'Sentiment_Score', 'score', 'snippet']
+
+# 中日韩统一表意文字及全角标点
+_CJK = r'　-〿㐀-䶿一-鿿豈-﫿＀-￯'
+_CJK_CHAR = re.compile(f'([{_CJK}])')
+_CJK_GAP = re.compile(f'(?<=[{_CJK}]) (?=[{_CJK}])')
+_QUERY_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS docs (
+    rowid INTEGER PRIMARY KEY,
+    article_id TEXT NOT NULL UNIQUE,
+    title TEXT,
+    publish_date TEXT,
+    source_media TEXT,
+    category TEXT,
+    sentiment INTEGER,
+    fingerprint INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_docs_date ON docs(publish_date);
+CREATE INDEX IF NOT EXISTS idx_docs_category ON docs(category, publish_date);
+CREATE INDEX IF NOT EXISTS idx_docs_media ON docs(source_media, publish_date);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+    {', '.join(TEXT_COLUMNS)},
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+"""
+
+# ============ 分词 ============
+
+def segment(text):
+    """中文逐字以空格分隔 (unicode61 会把连续汉字视为一个词)，英文保持不变"""
+    if not isinstance(text, str):
+        return ''
+    return _CJK_CHAR.sub(r' \1 ', text)
+
+def desegment(text):
+    """还原 segment 插入的空格，用于展示片段"""
+    return _CJK_GAP.sub('', re.sub(r' {2,}', ' ', text)).strip()
+
+def build_match(query, fields=None):
+    """
+    把用户输入转为 FTS5 查询表达式
+    - 空格分隔的词之间为 AND，双引号括起的内容为短语，词尾 * 为前缀匹配
+    - 大写的 OR / NOT 为二元运算符：句首、句尾或连续出现的 OR 忽略；
+      缺少左侧检索词的 NOT 无法表达 "排除"，直接报错 (忽略会变成相反的检索)
+    :param fields: 限定检索的列 (TEXT_COLUMNS 的键)，None 为全部
+    """
+    terms = []
+    for phrase, word in _QUERY_TOKEN.findall(query):
+        if word in ('OR', 'NOT'):
+            if not terms or terms[-1] in ('OR', 'NOT'):
+                if word == 'NOT':
+                    raise ValueError(f"NOT 前需要有检索词，例如 'border NOT Ladakh': {query!r}")
+                continue
+            terms.append(word)
+            continue
+        text = phrase or word
+        prefix = not phrase and text.endswith('*')
+        text = segment(text.rstrip('*') if prefix else text).replace('"', '""').strip()
+        if text:
+            terms.append(f'"{text}"' + ('*' if prefix else ''))
+    while terms and terms[-1] in ('OR', 'NOT'):
+        terms.pop()
+    if not terms:
+        raise ValueError(f"无效的查询: {query!r}")
+    expr = ' '.join(terms)
+    if fields:
+        unknown = set(fields) - set(TEXT_COLUMNS)
+        if unknown:
+            raise ValueError(f"未知检索字段: {sorted(unknown)} (可选: {list(TEXT_COLUMNS)})")
+        expr = f"{{{' '.join(fields)}}} : ({expr})"
+    return expr
+
+# ============ 建库与增量更新 ============
+
+def connect(db_path=INDEX_DB_PATH):
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+def _index_rows(df):
+    """把行级数据整理为索引记录 (元数据 + 分词后的文本 + 指纹)"""
+    rows = pd.DataFrame({'article_id': df['article_id'].astype(str)}, index=df.index)
+    for col in TEXT_COLUMNS.values():
+        rows[col] = df[col].where(df[col].notna(), None) if col in df.columns else None
+    rows['publish_date'] = to_day(df['publish_date']).dt.strftime('%Y-%m-%d')
+    rows['source_media'] = df['source_media'].fillna('未知')
+    rows['category'] = df['category'].fillna('未分类') if 'category' in df.columns else '未分类'
+    score = pd.to_numeric(df['Sentiment_Score'], errors='coerce') if 'Sentiment_Score' in df.columns else None
+    rows['sentiment'] = score.where(score.isin(VALID_SCORES)).astype('Int64') if score is not None else pd.NA
+    rows['fingerprint'] = pd.util.hash_pandas_object(rows.astype(str), index=False).astype('int64')
+    rows = rows.drop_duplicates('article_id', keep='last')
+    return rows.astype(object).where(rows.notna(), None)
+
+def update_search_index(df, db_path=INDEX_DB_PATH):
+    """
+    用新写入的行增量更新全文索引
+    :param df: 至少包含 article_id(可缺省，自动计算), title, content, publish_date, source_media 列
+    :return: (新增篇数, 更新篇数)
+    """
+    print("-" * 50)
+    print("【更新全文索引】")
+    start_time = time.time()
+    if 'article_id' not in df.columns:
+        from src.data.data_clean import add_article_id
+        df = add_article_id(df.copy())
+    rows = _index_rows(df)
+
+    conn = connect(db_path)
+    try:
+        existing = dict(conn.execute('SELECT article_id, fingerprint FROM docs').fetchall())
+        stored = rows['article_id'].map(existing)
+        is_new = stored.isna()
+        is_changed = ~is_new & (stored != rows['fingerprint'])
+        print(f"输入 {len(rows)} 篇，新增 {is_new.sum()} 篇，内容或标签变化 {is_changed.sum()} 篇")
+
+        with conn:
+            # 变化的文章先删除旧记录再重新写入
+            for article_id in rows.loc[is_changed, 'article_id']:
+                (rowid,) = conn.execute('SELECT rowid FROM docs WHERE article_id = ?', (article_id,)).fetchone()
+                conn.execute('DELETE FROM docs_fts WHERE rowid = ?', (rowid,))
+                conn.execute('DELETE FROM docs WHERE rowid = ?', (rowid,))
+            todo = rows[is_new | is_changed]
+            for record in todo.itertuples(index=False):
+                cur = conn.execute(
+                    'INSERT INTO docs (article_id, title, publish_date, source_media, category, sentiment, fingerprint) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (record.article_id, record.title, record.publish_date, record.source_media,
+                     record.category, record.sentiment, record.fingerprint)
+                )
+                conn.execute(
+                    f"INSERT INTO docs_fts (rowid, {', '.join(TEXT_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+                    (cur.lastrowid, *(segment(getattr(record, col)) for col in TEXT_COLUMNS.values()))
+                )
+        total = conn.execute('SELECT COUNT(*) FROM docs').fetchone()[0]
+    finally:
+        conn.close()
+    print(f"索引共 {total} 篇文章，耗时 {time.time() - start_time:.2f} 秒，已保存至: {db_path}")
+    print("-" * 50)
+    return int(is_new.sum()), int(is_changed.sum())
+
+def remove_from_search_index(article_ids, db_path=INDEX_DB_PATH):
+    """从索引中删除指定文章，返回删除的篇数"""
+    if not db_path.exists():
+        return 0
+    conn = connect(db_path)
+    removed = 0
+    try:
+        with conn:
+            for article_id in map(str, article_ids):
+                row = conn.execute('SELECT rowid FROM docs WHERE article_id = ?', (article_id,)).fetchone()
+                if row is None:
+                    continue
+                conn.execute('DELETE FROM docs_fts WHERE rowid = ?', row)
+                conn.execute('DELETE FROM docs WHERE rowid = ?', row)
+                removed += 1
+    finally:
+        conn.close()
+    return removed
+
+def build_search_index(df, db_path=INDEX_DB_PATH):
+    """从头重建索引，并合并 FTS 段以获得最佳查询速度"""
+    for suffix in ('', '-wal', '-shm'):
+        db_path.with_name(db_path.name + suffix).unlink(missing_ok=True)
+    result = update_search_index(df, db_path)
+    optimize_search_index(db_path)
+    return result
+
+def optimize_search_index(db_path=INDEX_DB_PATH):
+    """合并 FTS5 内部的增量段 (大量增量写入后执行一次即可)"""
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute("INSERT INTO docs_fts (docs_fts) VALUES ('optimize')")
+    finally:
+        conn.close()
+
+# ============ 查询 ============
+
+def _filters(category=None, source_media=None, start=None, end=None, sentiment=None):
+    """把过滤条件转为 SQL 条件与参数"""
+    clauses, params = [], []
+    for col, value in (('category', category), ('source_media', source_media)):
+        if value is not None:
+            values = [value] if isinstance(value, str) else list(value)
+            clauses.append(f"d.{col} IN ({', '.join('?' * len(values))})")
+            params += values
+    if start is not None:
+        clauses.append('d.publish_date >= ?')
+        params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+    if end is not None:
+        clauses.append('d.publish_date <= ?')
+        params.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+    if sentiment is not None:
+        low, high = sentiment if isinstance(sentiment, (tuple, list)) else (sentiment, sentiment)
+        clauses.append('d.sentiment BETWEEN ? AND ?')
+        params += [int(low), int(high)]
+    return clauses, params
+
+def search(
+    query=None,
+    category=None,
+    source_media=None,
+    start=None,
+    end=None,
+    sentiment=None,
+    fields=None,
+    page=1,
+    page_size=20,
+    db_path=INDEX_DB_PATH
+):
+    """
+    检索文章
+    :param query: 检索词 (语法见 build_match)；为空时只按过滤条件查询，按日期倒序
+    :param category / source_media: 过滤条件，可为单个值或列表
+    :param start / end: 日期范围 (闭区间)
+    :param sentiment: 情感得分，单个值或 (最小值, 最大值)
+    :param fields: 限定检索的列，如 ('title', 'summary_en')
+    :param page / page_size: 分页 (page 从 1 开始)
+    :return: DataFrame (score 越小越相关)，attrs 中包含 total / page / page_size / seconds
+    """
+    if page < 1 or page_size < 1:
+        raise ValueError("page 与 page_size 必须为正整数")
+    if not db_path.exists():
+        raise FileNotFoundError(f"全文索引不存在，请先运行 update_search_index: {db_path}")
+    start_time = time.perf_counter()
+    clauses, params = _filters(category, source_media, start, end, sentiment)
+
+    columns = 'd.rowid, d.article_id, d.title, d.publish_date, d.source_media, d.category, d.sentiment'
+    limit = [page_size, (page - 1) * page_size]
+    if query:
+        score = f"bm25(docs_fts, {', '.join(map(str, BM25_WEIGHTS))})"
+        params = [build_match(query, fields)] + params
+        if clauses:
+            # CROSS JOIN 固定由 FTS 驱动连接，避免规划器先扫描元数据索引再逐行 MATCH
+            base = f"FROM docs_fts CROSS JOIN docs d ON d.rowid = docs_fts.rowid WHERE {' AND '.join(['docs_fts MATCH ?'] + clauses)}"
+            sql = f"SELECT {columns}, {score} AS score {base} ORDER BY score LIMIT ? OFFSET ?"
+        else:
+            # 无过滤条件时只在 FTS 表内排序分页，再为当前页补元数据
+            base = 'FROM docs_fts WHERE docs_fts MATCH ?'
+            sql = (
+                f"SELECT {columns}, h.score FROM (SELECT rowid, {score} AS score {base} ORDER BY score LIMIT ? OFFSET ?) h "
+                "JOIN docs d ON d.rowid = h.rowid ORDER BY h.score"
+            )
+    else:
+        base = f"FROM docs d WHERE {' AND '.join(clauses) or '1'}"
+        sql = f"SELECT {columns}, NULL AS score {base} ORDER BY d.publish_date DESC, d.rowid LIMIT ? OFFSET ?"
+
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        try:
+            rows = conn.execute(sql, params + limit).fetchall()
+        except sqlite3.OperationalError as e:
+            if query and 'fts5' in str(e):
+                raise ValueError(f"无效的查询: {query!r} ({e})") from e
+            raise
+        total = conn.execute(f'SELECT COUNT(*) {base}', params).fetchone()[0]
+        snippets = {}
+        if query and rows:
+            # 片段只为当前页生成 (放在排序查询中会对全部命中逐行计算)
+            snippets = dict(conn.execute(
+                f"SELECT rowid, snippet(docs_fts, -1, '【', '】', '…', 16) FROM docs_fts "
+                f"WHERE docs_fts MATCH ? AND rowid IN ({', '.join('?' * len(rows))})",
+                [params[0]] + [row[0] for row in rows]
+            ).fetchall())
+    finally:
+        conn.close()
+
+    rows = [(*row[1:], snippets.get(row[0])) for row in rows]
+    result = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    result['snippet'] = result['snippet'].map(lambda s: desegment(s) if isinstance(s, str) else s)
+    result.attrs.update(total=total, page=page, page_size=page_size, seconds=time.perf_counter() - start_time)
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="全文检索索引")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('build', help="从 result_data.csv 重建索引")
+    p.add_argument('--input', default=str(config.PROCESSED_DATA_DIR / 'result_data.csv'))
+    p = sub.add_parser('update', help="用 result_data.csv 增量更新索引")
+    p.add_argument('--input', default=str(config.PROCESSED_DATA_DIR / 'result_data.csv'))
+    p = sub.add_parser('search', help="检索")
+    p.add_argument('query', nargs='?')
+    p.add_argument('--category', action='append')
+    p.add_argument('--media', action='append')
+    p.add_argument('--start')
+    p.add_argument('--end')
+    p.add_argument('--page', type=int, default=1)
+    p.add_argument('--page-size', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.command in ('build', 'update'):
+        df = pd.read_csv(args.input)
+        (build_search_index if args.command == 'build' else update_search_index)(df)
+        return
+    hits = search(args.query, category=args.category, source_media=args.media, start=args.start,
+                  end=args.end, page=args.page, page_size=args.page_size)
+    print(f"共 {hits.attrs['total']} 条结果 (第 {args.page} 页，{hits.attrs['seconds'] * 1000:.1f} ms)")
+    with pd.option_context('display.max_colwidth', 80, 'display.width', 200):
+        print(hits.drop(columns='score').to_string(index=False))
+
+if __name__ == '__main__':
+    main()
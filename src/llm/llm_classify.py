@@ -1,6 +1,9 @@
 from src import config
+from src.data.preprocess import preprocess_articles, prompt_version as _prompt_version
+from src.llm.sample_estimate import fill_from_sample
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
+import re
 import time
 import pandas as pd
 from tqdm import tqdm
@@ -15,9 +18,165 @@ def clean_json_string(text):
         text = text[start : end + 1]
     return text
 
-def call_llm_classify(title, content, retries=5):
+def classify_prompt_version(preprocess=False):
+    """当前分类提示词 (SYSTEM_PROMPT_01) 的版本号，开启预处理时包含预处理设置"""
+    return _prompt_version('classify', preprocess)
+
+_CATEGORY_VALUE = re.compile(r'"category"\s*:\s*"([^"]*)"')
+
+def category_margin(logprobs, text):
+    """
+    根据输出 token 的 logprobs 计算 category 判定的置信间隔：
+    category 取值覆盖的各 token 中，第一与第二候选 logprob 之差的最小值
+    (值越小说明模型越犹豫；中文分类名的公共前缀 token 差值很大，不影响取最小值)
+    """
+    match = _CATEGORY_VALUE.search(text or '')
+    if match is None or not logprobs:
+        return None
+    # 按 UTF-8 字节定位，避免多字节汉字被拆成多个 token 时错位
+    start = len(text[:match.start(1)].encode('utf-8'))
+    end = len(text[:match.end(1)].encode('utf-8'))
+    margins, pos = [], 0
+    for token in logprobs:
+        size = len(token.bytes) if token.bytes is not None else len(token.token.encode('utf-8'))
+        if pos < end and pos + size > start:
+            tops = sorted((t.logprob for t in token.top_logprobs or []), reverse=True)
+            if len(tops) >= 2:
+                margins.append(tops[0] - tops[1])
+        pos += size
+    return round(min(margins), 4) if margins else None
+
+class IncrementalJSONParser:
+    """
+    增量 JSON 解析器：逐块喂入流式输出，顶层字段一旦完整即写入 fields
+    (嵌套的列表/对象会在闭合后整体解析)
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self.state = "start"
+        self._pos = 0
+        self._key = None
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        """喂入新的文本块，返回本次新完成的字段字典"""
+        self.buffer += text
+        done = {}
+        buf = self.buffer
+        while self._pos < len(buf):
+            ch = buf[self._pos]
+            state = self.state
+            if state == "start":
+                if ch == '{':
+                    self.state = "key"
+            elif state == "key":
+                if ch == '"':
+                    self._start = self._pos
+                    self.state = "key_string"
+                elif ch == '}':
+                    self.state = "end"
+            elif state in ("key_string", "string_value"):
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    raw = buf[self._start:self._pos + 1]
+                    if state == "key_string":
+                        self._key = json.loads(raw)
+                        self.state = "colon"
+                    else:
+                        done[self._key] = json.loads(raw)
+                        self.state = "key"
+            elif state == "colon":
+                if ch == ':':
+                    self.state = "value"
+            elif state == "value":
+                if not ch.isspace():
+                    self._start = self._pos
+                    if ch == '"':
+                        self.state = "string_value"
+                    elif ch in '{[':
+                        self._depth = 1
+                        self.state = "nested_value"
+                    else:
+                        self.state = "scalar_value"
+            elif state == "nested_value":
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif ch == '\\':
+                        self._escape = True
+                    elif ch == '"':
+                        self._in_string = False
+                elif ch == '"':
+                    self._in_string = True
+                elif ch in '{[':
+                    self._depth += 1
+                elif ch in '}]':
+                    self._depth -= 1
+                    if self._depth == 0:
+                        done[self._key] = json.loads(buf[self._start:self._pos + 1])
+                        self.state = "key"
+            elif state == "scalar_value":
+                if ch in ',}' or ch.isspace():
+                    done[self._key] = json.loads(buf[self._start:self._pos])
+                    self.state = "end" if ch == '}' else "key"
+            self._pos += 1
+        self.fields.update(done)
+        return done
+
+    def partial(self, key):
+        """返回正在输出中的字符串字段的已生成部分 (用于 max_tokens 截断的情况)"""
+        if self.state != "string_value" or self._key != key:
+            return None
+        raw = self.buffer[self._start + 1:]
+        # 末尾可能是不完整的转义序列 (如 "\\" 或 "\\u4e")，逐字符回退直到可以解析
+        for cut in range(min(len(raw), 6) + 1):
+            try:
+                return json.loads(f'"{raw[:len(raw) - cut]}"')
+            except json.JSONDecodeError:
+                continue
+        return raw
+
+def _stream_classify(client, request_kwargs, stop_after_category):
+    """
+    流式调用并增量解析，返回 (解析结果, finish_reason)
+    stop_after_category=True 时 category 字段一完成即关闭连接，不再生成 reason
+    """
+    parser = IncrementalJSONParser()
+    finish_reason = None
+    stream = client.chat.completions.create(stream=True, **request_kwargs)
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.delta is not None and choice.delta.content:
+                parser.feed(choice.delta.content)
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+            if stop_after_category and 'category' in parser.fields:
+                finish_reason = finish_reason or "early_stop"
+                break
+    finally:
+        # 提前结束时主动关闭连接，服务端随之停止生成
+        stream.close()
+    return parser, finish_reason
+
+def call_llm_classify(title, content, retries=5, stream=False, stop_after_category=False, max_tokens=None, logprobs=False):
     """
     使用 OpenAI SDK 兼容模式调用 Zenmux/Gemini 进行总结
+    :param stream: 是否使用流式输出 + 增量 JSON 解析，category 完成即可确定标签
+    :param stop_after_category: (仅流式) category 字段完成后立即结束生成，reason 记为 None
+    :param max_tokens: (可选) 输出 token 上限，用于限制 reason 长度；被截断时保留已生成部分
+    :param logprobs: (仅非流式) 请求 token logprobs，结果中附带 margin (category 判定置信间隔)；
+                     接口不支持时 margin 为 None
     """
     client = OpenAI(
         api_key=config.API_KEY,
@@ -26,30 +185,53 @@ def call_llm_classify(title, content, retries=5):
     
     user_content = f"Headline: {title}\n\nArticle Content: {content}"
     
+    request_kwargs = dict(
+        model=config.MODEL_NAME, # 确保 config 中已更新为 "google/gemini-3-pro-preview"
+        messages=[
+            {"role": "system", "content": config.SYSTEM_PROMPT_01},
+            {"role": "user", "content": user_content}
+        ],
+        temperature=0.1,
+        response_format={"type": "json_object"}, # Gemini 支持 JSON 模式
+        timeout=120
+    )
+    if max_tokens is not None:
+        request_kwargs['max_tokens'] = max_tokens
+    if logprobs and not stream:
+        request_kwargs.update(logprobs=True, top_logprobs=5)
+    
     for attempt in range(retries):
         try:
-            response = client.chat.completions.create(
-                model=config.MODEL_NAME, # 确保 config 中已更新为 "google/gemini-3-pro-preview"
-                messages=[
-                    {"role": "system", "content": config.SYSTEM_PROMPT_01},
-                    {"role": "user", "content": user_content}
-                ],
-                temperature=0.1,
-                response_format={"type": "json_object"}, # Gemini 支持 JSON 模式
-                timeout=120,
-                stream=False
-            )
+            if stream:
+                parser, finish_reason = _stream_classify(client, request_kwargs, stop_after_category)
+            else:
+                response = client.chat.completions.create(stream=False, **request_kwargs)
+                finish_reason = response.choices[0].finish_reason
             
             # 2. 增加对 finish_reason 的检查 (Gemini 敏感内容过滤机制)
-            finish_reason = response.choices[0].finish_reason
             if finish_reason == "content_filter":
                 print(f"⚠️ 内容安全拦截 (Gemini): {title[:15]}...")
                 return None
             
-            result_text = response.choices[0].message.content
+            if not stream:
+                result_text = response.choices[0].message.content
+                if finish_reason != "length":
+                    # 确保 helper 函数存在，如果不存在需补充定义
+                    result = json.loads(clean_json_string(result_text))
+                    if logprobs:
+                        choice_logprobs = response.choices[0].logprobs
+                        result['margin'] = category_margin(choice_logprobs.content if choice_logprobs else None, result_text)
+                    return result
+                # 被 max_tokens 截断的 JSON 无法整体解析，改用增量解析器取出已完成字段
+                parser = IncrementalJSONParser()
+                parser.feed(result_text)
             
-            # 确保 helper 函数存在，如果不存在需补充定义
-            return json.loads(clean_json_string(result_text))
+            result = dict(parser.fields)
+            if 'category' not in result:
+                raise json.JSONDecodeError("输出中未解析到完整的 category 字段", parser.buffer, 0)
+            if 'reason' not in result:
+                result['reason'] = parser.partial('reason')
+            return result
 
         # 3. 错误处理 (适配通用 OpenAI 协议)
         except BadRequestError as e:
@@ -86,7 +268,14 @@ def llm_classify_concurrently(
     df, 
     output_csv_path=config.PROCESSED_DATA_DIR / 'classify_data.csv', 
     max_workers=None,  # 默认 None,让系统自动决定
-    save_interval=15   # 每处理 15 条保存一次
+    save_interval=15,  # 每处理 15 条保存一次
+    stream=False,      # 流式输出 + 增量解析
+    stop_after_category=False,  # 只要 category，不生成 reason (批量跑数时节省输出 token)
+    max_tokens=None,   # 输出 token 上限，用于限制 reason 长度
+    preprocess=False,  # 去样板文本并按 config.TOKEN_BUDGETS['classify'] 截取正文 (预处理设置计入 prompt_version)
+    stats_path=None,   # 预处理统计写入路径，默认 tables/预处理token统计.csv (分片进程各写各的)
+    reuse_sample=True, # 回填同一模型/提示词/预处理设置下的抽样估计结果，不再重复调用
+    logprobs=False     # (非流式) 记录 category 判定置信间隔 category_margin，供重标注计划筛选
 ):
     """
     并发处理 DataFrame,带性能监控和进度保存
@@ -113,6 +302,12 @@ def llm_classify_concurrently(
         df['category'] = None
     if 'reason' not in df.columns:
         df['reason'] = None
+    # 标签来源：产生该标签的提示词版本与模型
+    for col in ('prompt_version', 'label_model', 'category_margin'):
+        if col not in df.columns:
+            df[col] = None
+    if reuse_sample:
+        fill_from_sample(df, 'classify', preprocess)
         
     # 2. 筛选需要处理的行
     mask_to_process = ~df['category'].isin(VALID_CATEGORIES)
@@ -134,8 +329,13 @@ def llm_classify_concurrently(
     print(f"  - 线程数: {max_workers}")
     print(f"  - 每条重试: 5 次")
     print(f"  - 自动保存间隔: 每 {save_interval} 条")
+    if stream:
+        print(f"  - 流式模式: 开启 (category 完成后{'立即结束生成' if stop_after_category else '继续生成 reason'})")
+    if max_tokens is not None:
+        print(f"  - 输出 token 上限: {max_tokens}")
     
     # 4. 性能监控
+    prompt_version = classify_prompt_version(preprocess)
     start_time = time.time()
     completed_count = 0
     lock = Lock()  # 用于线程安全地更新计数器
@@ -149,6 +349,9 @@ def llm_classify_concurrently(
             if result: 
                 df.at[idx, 'category'] = result.get('category')
                 df.at[idx, 'reason'] = result.get('reason')
+                df.at[idx, 'prompt_version'] = prompt_version
+                df.at[idx, 'label_model'] = config.MODEL_NAME
+                df.at[idx, 'category_margin'] = result.get('margin')
             else:
                 df.at[idx, 'category'] = "Error"
                 df.at[idx, 'reason'] = "Failed after 5 retries"
@@ -166,7 +369,13 @@ def llm_classify_concurrently(
                 except Exception as e:
                     print(f"\n⚠️ 自动保存失败 (不影响运行，请检查文件是否被占用): {e}")
     
-    # 5. 并发执行
+    # 5. 文章预处理 (只处理本次需要调用的行)
+    if preprocess:
+        contents = preprocess_articles(df.loc[indices_to_process], stage='classify', stats_path=stats_path)
+    else:
+        contents = df['content']
+    
+    # 6. 并发执行
     print(f"\n🚀 开始并发处理...\n")
     
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
@@ -174,8 +383,12 @@ def llm_classify_concurrently(
             executor.submit(
                 call_llm_classify,           
                 df.at[idx, 'title'],         
-                df.at[idx, 'content'],
-                5
+                contents.at[idx],
+                5,
+                stream,
+                stop_after_category,
+                max_tokens,
+                logprobs
             ): idx 
             for idx in indices_to_process
         }
@@ -196,14 +409,14 @@ def llm_classify_concurrently(
                     completed_count += 1
                     # 也可以在这里加上保存逻辑，或者依赖下一次成功时的保存
 
-    # 6. 最终保存
+    # 7. 最终保存
     try:
         df.to_csv(output_csv_path, index=False, encoding='utf-8-sig')
         print(f"\n✅ 最终保存成功!")
     except Exception as e:
         print(f"\n❌ 最终保存失败: {e}")
     
-    # 7. 性能报告
+    # 8. 性能报告
     total_time = time.time() - start_time
     avg_rate = len(indices_to_process) / total_time
     
@@ -214,7 +427,7 @@ def llm_classify_concurrently(
     print(f"  - 平均速度: {avg_rate:.2f} 条/秒")
     print(f"  - 处理总数: {len(indices_to_process)} 条")
     
-    # 8. 最终统计
+    # 9. 最终统计
     remaining_invalid = df[~df['category'].isin(VALID_CATEGORIES)]
     if len(remaining_invalid) > 0:
         print(f"\n⚠️ 仍有 {len(remaining_invalid)} 条未归入合法分类")
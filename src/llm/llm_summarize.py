@@ -1,4 +1,10 @@
 from src import config
+from src.data.preprocess import preprocess_articles
+from src.llm.sample_estimate import fill_from_sample
+from src.data.analytics_cube import update_cube
+from src.data.entity_index import update_entity_index
+from src.data.search_index import update_search_index
+from src.models.sentiment_signals import update_signals
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 import time
@@ -86,7 +92,10 @@ def llm_summarize_concurrently(
     df, 
     output_csv_path=config.PROCESSED_DATA_DIR / 'result_data.csv', 
     max_workers=None, 
-    save_interval=15 
+    save_interval=15,
+    preprocess=False,  # 去样板文本并按 config.TOKEN_BUDGETS['summarize'] 截取正文
+    stats_path=None,  # 预处理统计写入路径，默认 tables/预处理token统计.csv (分片进程各写各的)
+    reuse_sample=True  # 回填同一模型/提示词/预处理设置下的抽样估计结果，不再重复调用
 ):
     # 4. 初始化线程锁
     lock = threading.Lock()
@@ -103,6 +112,8 @@ def llm_summarize_concurrently(
     for col, default_val in required_columns.items():
         if col not in df.columns:
             df[col] = default_val
+    if reuse_sample:
+        fill_from_sample(df, 'summarize', preprocess)
         
     mask_to_process = (
         df['Summary_CN'].isna() | 
@@ -151,6 +162,12 @@ def llm_summarize_concurrently(
                 rate = completed_count / elapsed
                 print(f"\n💾 已保存: {completed_count}/{len(indices_to_process)} ({rate:.2f} it/s, Err: {error_count})")
     
+    # 文章预处理 (只处理本次需要调用的行)
+    if preprocess:
+        contents = preprocess_articles(df.loc[indices_to_process], stage='summarize', stats_path=stats_path)
+    else:
+        contents = df['content']
+    
     print(f"\n🚀 开始并发处理 (Workers: {max_workers})...\n")
     
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
@@ -158,7 +175,7 @@ def llm_summarize_concurrently(
             executor.submit(
                 call_llm_summarize,           
                 df.at[idx, 'title'],         
-                df.at[idx, 'content'],
+                contents.at[idx],
                 5
             ): idx 
             for idx in indices_to_process
@@ -178,4 +195,15 @@ def llm_summarize_concurrently(
 
     df.to_csv(output_csv_path, index=False, encoding='utf-8-sig')
     print(f"\n✅ 处理完成! 错误数: {error_count}")
-    return None
\ No newline at end of file
+    return None
+
+def refresh_downstream(df):
+    """
+    摘要完成后的入库步骤：把标注结果增量写入分析立方体 (并推进情感信号)、实体索引与全文索引
+    各索引均按 article_id 增量更新，传入整表即可 (未变化的文章会被跳过)
+    """
+    update_signals(update_cube(df))
+    summary = df['Summary_CN']
+    processed = df[summary.notna() & (summary != "") & (summary != "Error")]
+    update_entity_index(processed)
+    update_search_index(processed)
\ No newline at end of file
@@ -0,0 +1,270 @@
+"""
+提示词版本感知的重标注：修改 SYSTEM_PROMPT_01 (或更换模型) 后只重跑受影响的行
+
+每条分类结果都带有 prompt_version (提示词哈希) 与 label_model，据此找出 "过期" 标签。
+1. plan_relabel: 按旧分类分层抽取校准样本，用新提示词重新标注，估计各分类的改判率
+   (Wilson 95% 置信区间)，改判率达到阈值的分类整体重跑；其余分类只重跑
+   上次判定置信间隔 (category_margin) 较低的行
+2. apply_relabel: 执行计划 (校准样本结果直接复用)，输出新旧版本间的标签变化报告，
+   并把变化同步到 result_data.csv、分析立方体、情感信号、实体索引与全文索引
+用法:
+    from src.llm.relabel import plan_relabel, apply_relabel
+    plan = plan_relabel(calibration_size=300)
+    apply_relabel(plan)
+"""
+from src import config
+from src.data.analytics_cube import CUBE_PATH, update_cube, remove_from_cube
+from src.data.data_clean import add_article_id
+from src.data.entity_index import INDEX_PATH, update_entity_index, remove_from_entity_index
+from src.data.search_index import INDEX_DB_PATH, update_search_index, remove_from_search_index
+from src.llm.llm_classify import classify_prompt_version, llm_classify_concurrently
+from src.llm.sample_estimate import PROVENANCE_COLUMNS, SUMMARIZE_CATEGORIES, Z_95, draw_sample
+from src.models.sentiment_signals import update_signals
+import numpy as np
+import pandas as pd
+
+RELABEL_DIR = config.INTERIM_DATA_DIR / 'relabel'
+CLASSIFY_PATH = config.PROCESSED_DATA_DIR / 'classify_data.csv'
+RESULT_PATH = config.PROCESSED_DATA_DIR / 'result_data.csv'
+# 引入版本记录之前产生的标签
+UNVERSIONED = 'unversioned'
+LABEL_COLUMNS = ['category', 'reason'] + PROVENANCE_COLUMNS['classify']
+
+def wilson_interval(k, n, z=Z_95):
+    """二项比例的 Wilson 置信区间 (样本少、比例接近 0 时比正态近似可靠)"""
+    k, n = np.asarray(k, dtype=float), np.asarray(n, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = k / n
+        denom = 1 + z ** 2 / n
+        center = (p + z ** 2 / (2 * n)) / denom
+        half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denom
+    return np.clip(center - half, 0, 1), np.clip(center + half, 0, 1)
+
+def _versions(df):
+    """补齐标签来源列 (旧数据没有这些列时记为 unversioned)"""
+    for col in PROVENANCE_COLUMNS['classify']:
+        if col not in df.columns:
+            df[col] = None
+    df['prompt_version'] = df['prompt_version'].fillna(UNVERSIONED)
+    df['label_model'] = df['label_model'].fillna(UNVERSIONED)
+    return df
+
+def stale_mask(df, version=None, model=None):
+    """已有合法标签、但不是由当前提示词版本与模型产生的行"""
+    version = version or classify_prompt_version()
+    model = model or config.MODEL_NAME
+    valid = df['category'].isin(config.VALID_CATEGORIES)
+    return valid & ((df['prompt_version'] != version) | (df['label_model'] != model))
+
+def calibration_path(version):
+    return RELABEL_DIR / f'calibration_{version}.csv'
+
+def run_calibration(df, stale, calibration_size=300, seed=0, max_workers=None, logprobs=False):
+    """
+    按旧分类分层抽取过期行，用当前提示词重新标注 (同一版本已有校准结果时直接续跑)
+    :return: 带 old_category / old_version 列的校准样本
+    """
+    version = classify_prompt_version()
+    path = calibration_path(version)
+    pool = df[stale]
+    sample = draw_sample(pool, min(calibration_size, len(pool)), seed, strata=pool['category'])
+    sample = sample.rename(columns={'category': 'old_category', 'prompt_version': 'old_version'})
+    sample = sample.drop(columns=[c for c in LABEL_COLUMNS if c in sample.columns])
+    if path.exists():
+        previous = pd.read_csv(path)
+        if set(previous['article_id']) == set(sample['article_id']):
+            sample = previous
+    RELABEL_DIR.mkdir(parents=True, exist_ok=True)
+    return llm_classify_concurrently(sample, output_csv_path=path, max_workers=max_workers, logprobs=logprobs)
+
+def change_rates(calibration, min_change_rate=0.05):
+    """
+    各旧分类在新提示词下的改判率
+    改判率不低于 min_change_rate 且至少观察到一次改判的分类视为受影响；
+    校准样本中没有出现的分类无法估计，保守起见也视为受影响
+    """
+    done = calibration[calibration['category'].isin(config.VALID_CATEGORIES)]
+    changed = done['category'] != done['old_category']
+    grouped = changed.groupby(done['old_category'])
+    rates = pd.DataFrame({'n': grouped.size(), 'changed': grouped.sum()})
+    rates = rates.reindex(config.VALID_CATEGORIES, fill_value=0).astype(int)
+    rates['change_rate'] = rates['changed'] / rates['n'].where(rates['n'] > 0)
+    rates['ci_low'], rates['ci_high'] = wilson_interval(rates['changed'], rates['n'])
+    moved = done[changed].groupby('old_category')['category'].agg(lambda s: s.value_counts().index[0])
+    rates['top_destination'] = moved.reindex(rates.index)
+    rates['affected'] = (rates['n'] == 0) | ((rates['changed'] > 0) & (rates['change_rate'] >= min_change_rate))
+    rates.index.name = 'old_category'
+    return rates
+
+def plan_relabel(
+    calibration_size=300,
+    seed=0,
+    min_change_rate=0.05,  # 分类改判率达到此值即整体重跑
+    margin_threshold=1.0,  # 未受影响分类中，category_margin 低于此值 (logprob 差) 的行也重跑
+    max_workers=None,
+    logprobs=False,
+    recalibrate=False,     # 同一版本已有计划时默认沿用其改判率，不再重新校准
+    input_path=CLASSIFY_PATH
+):
+    """
+    生成重标注计划
+    :return: dict，包含 version / model / rates (各分类改判率) / targets (待重跑的 article_id)
+    """
+    print("=" * 60)
+    print("【重标注计划】")
+    df = _versions(add_article_id(pd.read_csv(input_path)))
+    version, model = classify_prompt_version(), config.MODEL_NAME
+    stale = stale_mask(df, version, model)
+    invalid = ~df['category'].isin(config.VALID_CATEGORIES)
+    print(f"📌 当前提示词版本 {version}，模型 {model}")
+    print(f"📊 总行数: {len(df)}，过期标签 {stale.sum()} 行，未完成/错误 {invalid.sum()} 行")
+    print(df.loc[stale, 'prompt_version'].value_counts().rename('行数').to_string())
+
+    plan = {'version': version, 'model': model, 'input_path': input_path,
+            'rates': pd.DataFrame(), 'targets': df.loc[invalid, 'article_id'].tolist()}
+    if not stale.any():
+        print("✅ 所有标签均为当前版本，无需校准")
+        return plan
+
+    plan_path = config.TABLES_DIR / f'重标注计划_{version}.csv'
+    if plan_path.exists() and not recalibrate:
+        rates = pd.read_csv(plan_path, index_col='old_category')
+        calibrated = rates['n'].sum()
+        print(f"♻️ 沿用已有校准结果: {plan_path}")
+    else:
+        calibration = run_calibration(df, stale, calibration_size, seed, max_workers, logprobs)
+        rates = change_rates(calibration, min_change_rate)
+        calibrated = len(calibration)
+    affected = rates.index[rates['affected']].tolist()
+
+    margin = pd.to_numeric(df['category_margin'], errors='coerce')
+    low_margin = stale & ~df['category'].isin(affected) & (margin < margin_threshold)
+    targets = (stale & df['category'].isin(affected)) | low_margin | invalid
+    plan.update(rates=rates, targets=df.loc[targets, 'article_id'].tolist())
+
+    print(f"\n📊 各分类改判率 (校准样本 {calibrated} 篇，95% Wilson 区间):")
+    for category, row in rates.iterrows():
+        flag = "🔁" if row['affected'] else "  "
+        if row['n'] == 0:
+            print(f"  {flag} {category}: 样本中未出现")
+            continue
+        destination = f" → 多改为 {row['top_destination']}" if row['changed'] else ""
+        print(f"  {flag} {category}: {row['change_rate']:.1%} [{row['ci_low']:.1%}, {row['ci_high']:.1%}] "
+              f"({row['changed']}/{row['n']}){destination}")
+    print(f"\n🎯 待重跑 {targets.sum()} 行 (受影响分类 {len(affected)} 个，低置信间隔 {low_margin.sum()} 行，"
+          f"未完成 {invalid.sum()} 行)，其余 {stale.sum() - (targets & stale).sum()} 行沿用旧标签")
+    if margin[stale].isna().all():
+        print("   (旧标签没有 category_margin，低置信筛选未生效；分类时开启 logprobs=True 可记录)")
+
+    config.TABLES_DIR.mkdir(parents=True, exist_ok=True)
+    rates.round(4).to_csv(plan_path, encoding='utf-8-sig')
+    print(f"计划已保存至: {plan_path}")
+    print("=" * 60)
+    return plan
+
+def label_diff(before, after):
+    """
+    比较重标注前后的标签
+    :return: (旧分类 × 新分类 交叉表, 发生变化的行明细)
+    """
+    merged = before.merge(after, on='article_id', suffixes=('_old', '_new'))
+    crosstab = pd.crosstab(merged['category_old'].fillna('未分类'), merged['category_new'].fillna('未分类'),
+                           rownames=['旧分类'], colnames=['新分类'], margins=True, margins_name='合计')
+    changes = merged[merged['category_old'].fillna('') != merged['category_new'].fillna('')]
+    return crosstab, changes.reset_index(drop=True)
+
+def apply_relabel(plan=None, max_workers=None, logprobs=False, update_results=True, **plan_kwargs):
+    """
+    执行重标注计划：校准样本结果全部写回 (不论所在分类是否受影响)，其余待重跑行清空后调用分类流程
+    :param plan: plan_relabel 的返回值，缺省时现场生成
+    :param update_results: 是否把标签变化同步到 result_data.csv 及下游索引
+    :return: 发生变化的行明细
+    """
+    if plan is None:
+        plan = plan_relabel(max_workers=max_workers, logprobs=logprobs, **plan_kwargs)
+    version = plan['version']
+    if version != classify_prompt_version() or plan['model'] != config.MODEL_NAME:
+        raise ValueError("计划生成后提示词或模型已变化，请重新运行 plan_relabel")
+
+    df = _versions(add_article_id(pd.read_csv(plan['input_path'])))
+    before = df[['article_id', 'category', 'prompt_version']].copy()
+    targets = df['article_id'].isin(plan['targets'])
+    for col in LABEL_COLUMNS:
+        df[col] = df[col].astype(object)
+    df.loc[targets, LABEL_COLUMNS] = None
+
+    # 校准样本已按当前版本标注，直接写回 (包括未受影响分类中的样本)
+    path = calibration_path(version)
+    calibrated = pd.Series(False, index=df.index)
+    if path.exists():
+        calibration = pd.read_csv(path)
+        calibration = calibration[calibration['category'].isin(config.VALID_CATEGORIES)]
+        lookup = calibration.drop_duplicates('article_id').set_index('article_id')[LABEL_COLUMNS]
+        calibrated = (targets | stale_mask(df, version, plan['model'])) & df['article_id'].isin(lookup.index)
+        df.loc[calibrated, LABEL_COLUMNS] = lookup.loc[df.loc[calibrated, 'article_id'], LABEL_COLUMNS].to_numpy()
+        print(f"♻️ 复用校准样本标注: {calibrated.sum()} 条")
+    relabeled = df.loc[targets | calibrated, 'article_id']
+
+    df = llm_classify_concurrently(df, output_csv_path=plan['input_path'], max_workers=max_workers, logprobs=logprobs)
+
+    crosstab, changes = label_diff(before, df[['article_id', 'category', 'prompt_version']])
+    config.TABLES_DIR.mkdir(parents=True, exist_ok=True)
+    RELABEL_DIR.mkdir(parents=True, exist_ok=True)
+    crosstab_path = config.TABLES_DIR / f'标签变化_{version}.csv'
+    crosstab.to_csv(crosstab_path, encoding='utf-8-sig')
+    changes = changes.merge(df[['article_id', 'title', 'publish_date', 'source_media', 'category_margin']],
+                            on='article_id', how='left')
+    changes.to_csv(RELABEL_DIR / f'label_changes_{version}.csv', index=False, encoding='utf-8-sig')
+    print("-" * 50)
+    print(f"【标签变化】重新标注 {len(relabeled)} 行，其中 {len(changes)} 行分类改变")
+    if not changes.empty:
+        print(changes.groupby(['category_old', 'category_new']).size().sort_values(ascending=False).head(10).to_string())
+    print(f"交叉表已保存至: {crosstab_path}")
+    print("-" * 50)
+
+    if update_results and not relabeled.empty and RESULT_PATH.exists():
+        sync_results(df, changes, relabeled)
+    return changes
+
+def sync_results(df, changes, relabeled, result_path=RESULT_PATH):
+    """
+    把重标注结果同步到摘要结果及下游索引
+    :param relabeled: 本次按当前版本重新标注的 article_id (含分类未变的行)
+    - 重新标注且仍在摘要范围内的文章：更新分类与标签来源，摘要保留
+    - 改为 "其他" 的文章：从结果及立方体、实体索引、全文索引中移除
+    - 从 "其他" 改入摘要范围的文章：追加到结果中 (摘要为空，下次运行 llm_summarize 时补齐)
+    """
+    print("-" * 50)
+    print("【同步摘要结果】")
+    result = add_article_id(pd.read_csv(result_path))
+    labels = df.drop_duplicates('article_id').set_index('article_id')
+    in_scope = changes['category_new'].isin(SUMMARIZE_CATEGORIES)
+    present = changes['article_id'].isin(result['article_id'])
+
+    dropped = changes.loc[present & ~in_scope, 'article_id']
+    result = result[~result['article_id'].isin(dropped)]
+    updated = result['article_id'].isin(relabeled) & result['article_id'].isin(labels.index)
+    for col in LABEL_COLUMNS:
+        if col not in result.columns:
+            result[col] = None
+        result[col] = result[col].astype(object)
+        result.loc[updated, col] = labels.loc[result.loc[updated, 'article_id'], col].to_numpy()
+    # 只有分类变化的文章需要写入下游索引
+    summarized = result[updated & result['article_id'].isin(changes['article_id'])]
+    appended = labels.loc[changes.loc[~present & in_scope, 'article_id']].reset_index()
+    result = pd.concat([result, appended[[c for c in appended.columns if c in result.columns]]], ignore_index=True)
+    result.to_csv(result_path, index=False, encoding='utf-8-sig')
+    print(f"更新标签 {updated.sum()} 篇 (分类变化 {len(summarized)} 篇)，移出 {len(dropped)} 篇，新增待摘要 {len(appended)} 篇")
+    print("-" * 50)
+
+    # 下游索引只在已建立时同步 (情感信号会发现历史日期的变化并从检查点重算)
+    if CUBE_PATH.exists():
+        remove_from_cube(dropped)
+        update_signals(update_cube(summarized))
+    if INDEX_PATH.exists():
+        remove_from_entity_index(dropped)
+        update_entity_index(summarized)
+    if INDEX_DB_PATH.exists():
+        remove_from_search_index(dropped)
+        update_search_index(summarized)
+    return result
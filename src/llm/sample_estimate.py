@@ -0,0 +1,310 @@
+"""
+抽样估计：在全量调用 LLM 之前，按 媒体 × 月份 分层抽取小样本，
+用现有的 classify / summarize 流程标注样本，几分钟内给出
+- 各议题占比、整体及分议题平均情感 (含 95% 置信区间，分层抽样设计下的估计)
+- 全量运行的 token 消耗与耗时预估
+
+样本结果连同模型名与模型输入版本 (提示词 + 预处理设置) 的指纹一起保存，
+全量运行时 (reuse_sample=True) 自动回填，对应文章不再重复调用；
+模型、提示词或预处理设置变化后样本自动失效
+用法:
+    from src.llm.sample_estimate import estimate_from_sample
+    report = estimate_from_sample(sample_size=400)
+"""
+from src import config
+from src.data.analytics_cube import to_day, ERROR_SCORE
+from src.data.data_clean import add_article_id
+from src.data.preprocess import STAGE_PROMPTS, count_tokens, preprocess_content, prompt_version
+import hashlib
+import json
+import time
+import numpy as np
+import pandas as pd
+
+SAMPLE_DIR = config.INTERIM_DATA_DIR / 'sample'
+META_PATH = SAMPLE_DIR / 'sample_meta.json'
+SAMPLE_FILES = {
+    'classify': SAMPLE_DIR / 'classify_sample.csv',
+    'summarize': SAMPLE_DIR / 'summarize_sample.csv',
+}
+STAGE_COLUMNS = {
+    'classify': ['category', 'reason'],
+    'summarize': ['Chinese_Entities', 'Indian_Entities', 'Sentiment_Score', 'Summary_CN', 'Summary_EN'],
+}
+# 标签来源列 (回填时一并复制，样本文件中不存在时跳过)
+PROVENANCE_COLUMNS = {'classify': ['prompt_version', 'label_model', 'category_margin'], 'summarize': []}
+# 进入 summarize 阶段的分类 (与 load_classify_data 一致，"其他" 不做摘要)
+SUMMARIZE_CATEGORIES = [c for c in config.VALID_CATEGORIES if c != "其他"]
+POOLED_STRATUM = '其他 (小层合并)'
+Z_95 = 1.959964
+
+def prompt_fingerprint(stage, preprocess=False):
+    """模型名 + 模型输入版本 (提示词与预处理设置，见 preprocess.prompt_version) 的指纹，用于判断样本结果能否复用"""
+    text = f"{config.MODEL_NAME}\x1f{prompt_version(stage, preprocess)}"
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+
+# ============ 分层抽样 ============
+
+def assign_strata(df):
+    """媒体 × 月份 分层标签"""
+    month = to_day(df['publish_date']).dt.strftime('%Y-%m').fillna('未知')
+    return df['source_media'].fillna('未知').astype(str) + ' | ' + month
+
+def allocate(sizes, sample_size, min_per_stratum=2):
+    """
+    按层规模比例分配样本量 (最大余数法)
+    按比例分不到 min_per_stratum 的小层合并为一层，保证每层至少两条样本以便估计方差
+    :param sizes: 各层规模 Series
+    :return: (层标签映射 {原层: 最终层}, 最终各层规模 N_h, 各层样本量 n_h)
+    """
+    share = sizes / sizes.sum() * sample_size
+    small = share < min_per_stratum
+    mapping = {s: (POOLED_STRATUM if small[s] else s) for s in sizes.index}
+    final = sizes.groupby(pd.Series(mapping)).sum()
+    share = final / final.sum() * sample_size
+    alloc = np.floor(share).astype(int)
+    remainder = sample_size - alloc.sum()
+    if remainder > 0:
+        alloc[(share - alloc).sort_values(ascending=False).index[:remainder]] += 1
+    alloc = alloc.clip(lower=min_per_stratum).clip(upper=final)
+    return mapping, final, alloc
+
+def draw_sample(df, sample_size=400, seed=0, min_per_stratum=2, strata=None):
+    """
+    抽取分层样本，返回带 stratum / N_h 列的样本
+    :param strata: (可选) 与 df 同索引的分层标签，默认按 媒体 × 月份
+    """
+    strata = assign_strata(df) if strata is None else strata.astype(str)
+    mapping, sizes, alloc = allocate(strata.value_counts(), sample_size, min_per_stratum)
+    strata = strata.map(mapping)
+    rng = np.random.default_rng(seed)
+    picked = []
+    for stratum, n in alloc.sort_index().items():
+        members = np.flatnonzero((strata == stratum).to_numpy())
+        picked.append(np.sort(rng.choice(members, size=n, replace=False)))
+    sample = df.iloc[np.concatenate(picked)].copy()
+    sample['stratum'] = strata.iloc[np.concatenate(picked)].to_numpy()
+    sample['N_h'] = sample['stratum'].map(sizes).astype(int)
+    print(f"🎯 分层抽样: 总体 {len(df)} 篇，{len(alloc)} 层，抽取 {len(sample)} 篇 (随机种子 {seed})")
+    return sample.reset_index(drop=True)
+
+# ============ 估计 ============
+
+def stratified_ratio(sample, y, d=None):
+    """
+    分层抽样下 ΣY / ΣD 的估计及 95% 置信区间 (d 缺省为 1，即总体均值或比例)
+    方差按线性化法计算，含有限总体校正
+    """
+    y = pd.Series(np.asarray(y, dtype=float), index=sample.index)
+    d = pd.Series(1.0 if d is None else np.asarray(d, dtype=float), index=sample.index)
+    groups = sample['stratum']
+    N_h = sample.groupby(groups)['N_h'].first()
+    W_h = N_h / N_h.sum()
+    n_h = groups.value_counts().reindex(N_h.index)
+    Y = (W_h * y.groupby(groups).mean()).sum()
+    D = (W_h * d.groupby(groups).mean()).sum()
+    if D == 0:
+        return {'estimate': np.nan, 'se': np.nan, 'ci_low': np.nan, 'ci_high': np.nan, 'n': 0}
+    R = Y / D
+    z = (y - R * d) / D
+    s2 = z.groupby(groups).var(ddof=1).fillna(0.0)
+    variance = (W_h ** 2 * (1 - n_h / N_h) * s2 / n_h).sum()
+    se = float(np.sqrt(variance))
+    return {'estimate': R, 'se': se, 'ci_low': R - Z_95 * se, 'ci_high': R + Z_95 * se, 'n': int((d > 0).sum())}
+
+def _token_usage(sample, stage, preprocess=False):
+    """按与正式调用相同的预处理设置估算每篇的输入/输出 token (本地估算)"""
+    system_tokens = count_tokens(getattr(config, STAGE_PROMPTS[stage]))
+    budget = config.TOKEN_BUDGETS.get(stage)
+    inputs = [
+        system_tokens + count_tokens(f"Headline: {title}\n\nArticle Content: ")
+        + (preprocess_content(content, budget, media)[3] if preprocess else count_tokens(content))
+        for title, content, media in zip(sample['title'], sample['content'], sample['source_media'])
+    ]
+    fields = sample[STAGE_COLUMNS[stage]].astype(object).where(sample[STAGE_COLUMNS[stage]].notna(), None)
+    outputs = [count_tokens(json.dumps(dict(zip(fields.columns, row)), ensure_ascii=False, default=str))
+               for row in fields.itertuples(index=False)]
+    return np.array(inputs, dtype=float), np.array(outputs, dtype=float)
+
+# ============ 样本缓存 ============
+
+def _load_meta():
+    return json.loads(META_PATH.read_text(encoding='utf-8')) if META_PATH.exists() else {}
+
+def _save_meta(meta):
+    SAMPLE_DIR.mkdir(parents=True, exist_ok=True)
+    META_PATH.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding='utf-8')
+
+def load_sample_results(stage, preprocess=False):
+    """读取与当前模型/提示词/预处理设置一致的样本结果，不存在或已失效时返回 None"""
+    meta = _load_meta().get(stage)
+    path = SAMPLE_FILES[stage]
+    if not meta or not path.exists() or meta['fingerprint'] != prompt_fingerprint(stage, preprocess):
+        return None
+    return pd.read_csv(path)
+
+def fill_from_sample(df, stage, preprocess=False):
+    """
+    全量运行前用样本结果回填 (按 article_id 匹配，只填尚未完成的行)
+    :param preprocess: 全量运行是否做预处理，与样本运行的设置不一致时不回填
+    :return: 回填的行数
+    """
+    sample = load_sample_results(stage, preprocess)
+    if sample is None:
+        return 0
+    add_article_id(df)
+    columns = STAGE_COLUMNS[stage] + [c for c in PROVENANCE_COLUMNS[stage] if c in sample.columns]
+    if stage == 'classify':
+        sample = sample[sample['category'].isin(config.VALID_CATEGORIES)]
+        todo = ~df['category'].isin(config.VALID_CATEGORIES)
+    else:
+        summary = sample['Summary_CN']
+        sample = sample[summary.notna() & (summary != "") & (summary != "Error")]
+        todo = df['Summary_CN'].isna() | (df['Summary_CN'] == "") | (df['Summary_CN'] == "Error")
+    lookup = sample.drop_duplicates('article_id').set_index('article_id')[columns]
+    hit = todo & df['article_id'].isin(lookup.index)
+    if hit.any():
+        for col in columns:
+            if col not in df.columns:
+                df[col] = None
+            df[col] = df[col].astype(object)
+            df.loc[hit, col] = lookup.loc[df.loc[hit, 'article_id'], col].to_numpy()
+        print(f"♻️ 复用抽样结果 [{stage}]: {hit.sum()} 条")
+    return int(hit.sum())
+
+def _run_stage(sample, stage, meta, max_workers, preprocess=False):
+    """用现有并发流程标注样本 (已有同版本结果时续跑)，记录吞吐"""
+    from src.llm.llm_classify import llm_classify_concurrently
+    from src.llm.llm_summarize import llm_summarize_concurrently
+    SAMPLE_DIR.mkdir(parents=True, exist_ok=True)
+    previous = load_sample_results(stage, preprocess)
+    if previous is not None and set(previous['article_id']) == set(sample['article_id']):
+        sample = previous.set_index('article_id').loc[sample['article_id']].reset_index()
+    else:
+        meta.pop(stage, None)
+    path = SAMPLE_FILES[stage]
+    if stage == 'classify':
+        todo = (~sample['category'].isin(config.VALID_CATEGORIES)).sum() if 'category' in sample else len(sample)
+    else:
+        todo = sample['Summary_CN'].isna().sum() if 'Summary_CN' in sample else len(sample)
+
+    start_time = time.time()
+    if stage == 'classify':
+        llm_classify_concurrently(sample, output_csv_path=path, max_workers=max_workers,
+                                  preprocess=preprocess, reuse_sample=False)
+    else:
+        llm_summarize_concurrently(sample, output_csv_path=path, max_workers=max_workers,
+                                   preprocess=preprocess, reuse_sample=False)
+    seconds = time.time() - start_time
+    if not path.exists():
+        # 样本结果未能写出时不记入元数据，避免全量运行误以为可以复用
+        print(f"⚠️ 样本结果未保存 [{stage}]: {path}")
+        meta.pop(stage, None)
+        return sample
+
+    record = meta.get(stage, {'called': 0, 'seconds': 0.0})
+    if todo:
+        record = {'called': record['called'] + int(todo), 'seconds': record['seconds'] + seconds}
+    record.update(fingerprint=prompt_fingerprint(stage, preprocess), model=config.MODEL_NAME, workers=max_workers)
+    meta[stage] = record
+    return sample
+
+# ============ 主入口 ============
+
+def estimate_from_sample(sample_size=400, seed=0, max_workers=None, input_path=None, preprocess=False):
+    """
+    分层抽样估计
+    :param sample_size: 样本量 (各层至少 2 篇，实际样本量可能略大)
+    :param max_workers: 样本运行并发数，同时作为全量耗时预估的并发假设
+    :param preprocess: 样本运行是否做预处理，应与计划的全量运行一致 (否则样本结果不会被回填)
+    :return: dict，包含 categories / sentiment / cost 三张估计表与分类失败率 failure_rate
+    """
+    print("=" * 60)
+    print("【抽样估计】")
+    population = add_article_id(pd.read_csv(input_path or config.PROCESSED_DATA_DIR / 'cleaned_data.csv'))
+    N = len(population)
+    max_workers = max_workers or min(10, sample_size)
+
+    meta = _load_meta()
+    if meta.get('seed') != seed or meta.get('sample_size') != sample_size:
+        meta = {'seed': seed, 'sample_size': sample_size}
+    sample = draw_sample(population, sample_size, seed)
+
+    # 1. 分类
+    classified = _run_stage(sample, 'classify', meta, max_workers, preprocess)
+    sample['category'] = classified['category'].to_numpy()
+    sample['reason'] = classified['reason'].to_numpy()
+    _save_meta(meta)
+
+    # 2. 摘要与情感 (只对进入 summarize 阶段的分类)
+    to_summarize = sample['category'].isin(SUMMARIZE_CATEGORIES)
+    summarized = _run_stage(sample[to_summarize].reset_index(drop=True), 'summarize', meta, max_workers, preprocess)
+    _save_meta(meta)
+    summary = summarized.set_index('article_id')[STAGE_COLUMNS['summarize']]
+    for col in STAGE_COLUMNS['summarize']:
+        sample[col] = sample['article_id'].map(summary[col])
+
+    # 3. 议题分布 (只在分类成功的文章中计算占比，失败 (Error 等) 单独报告失败率)
+    labeled = sample['category'].isin(config.VALID_CATEGORIES)
+    failure_rate = stratified_ratio(sample, ~labeled)
+    rows = []
+    for category in config.VALID_CATEGORIES:
+        est = stratified_ratio(sample, sample['category'] == category, labeled)
+        rows.append({'category': category, **est, 'projected_articles': est['estimate'] * N})
+    categories = pd.DataFrame(rows).sort_values('estimate', ascending=False).reset_index(drop=True)
+
+    # 4. 平均情感 (-999 与缺失不计入)
+    score = pd.to_numeric(sample['Sentiment_Score'], errors='coerce')
+    valid = score.notna() & (score != ERROR_SCORE) & to_summarize
+    rows = [{'category': '全部', **stratified_ratio(sample, score.where(valid, 0), valid)}]
+    for category in SUMMARIZE_CATEGORIES:
+        domain = valid & (sample['category'] == category)
+        if domain.any():
+            rows.append({'category': category, **stratified_ratio(sample, score.where(domain, 0), domain)})
+    sentiment = pd.DataFrame(rows)
+
+    # 5. 成本预估
+    rows = []
+    for stage, mask in (('classify', pd.Series(True, index=sample.index)), ('summarize', to_summarize)):
+        inputs, outputs = (np.zeros(len(sample)), np.zeros(len(sample)))
+        if mask.any():
+            part_in, part_out = _token_usage(sample[mask], stage, preprocess)
+            inputs[mask.to_numpy()], outputs[mask.to_numpy()] = part_in, part_out
+        share = stratified_ratio(sample, mask)
+        tokens = stratified_ratio(sample, inputs + outputs)
+        record = meta.get(stage, {})
+        rate = record['called'] / record['seconds'] if record.get('seconds') else np.nan
+        articles = share['estimate'] * N
+        rows.append({
+            'stage': stage,
+            'articles': round(articles),
+            'input_tokens': stratified_ratio(sample, inputs)['estimate'] * N,
+            'output_tokens': stratified_ratio(sample, outputs)['estimate'] * N,
+            'total_tokens': tokens['estimate'] * N,
+            'total_tokens_ci_low': tokens['ci_low'] * N,
+            'total_tokens_ci_high': tokens['ci_high'] * N,
+            'articles_per_second': rate,
+            'projected_hours': articles / rate / 3600 if rate else np.nan,
+            'workers': max_workers,
+        })
+    cost = pd.DataFrame(rows)
+
+    config.TABLES_DIR.mkdir(parents=True, exist_ok=True)
+    for name, table in (('抽样估计_议题分布.csv', categories), ('抽样估计_情感.csv', sentiment), ('抽样估计_成本.csv', cost)):
+        table.round(4).to_csv(config.TABLES_DIR / name, index=False, encoding='utf-8-sig')
+
+    print(f"\n📊 议题分布估计 (样本 {len(sample)} 篇，总体 {N} 篇，95% 置信区间):")
+    for r in categories.itertuples():
+        print(f"  - {r.category}: {r.estimate:.1%} [{max(r.ci_low, 0):.1%}, {min(r.ci_high, 1):.1%}]")
+    print(f"  分类失败率: {failure_rate['estimate']:.1%} [{max(failure_rate['ci_low'], 0):.1%}, "
+          f"{min(failure_rate['ci_high'], 1):.1%}] (样本中失败 {(~labeled).sum()} 篇，不计入上述占比)")
+    overall = sentiment.iloc[0]
+    print(f"\n💬 平均情感: {overall['estimate']:.2f} [{overall['ci_low']:.2f}, {overall['ci_high']:.2f}] (有效样本 {overall['n']})")
+    print("\n💰 全量运行预估:")
+    for r in cost.itertuples():
+        print(f"  - {r.stage}: {r.articles} 篇，约 {r.total_tokens / 1e6:.2f}M tokens "
+              f"[{r.total_tokens_ci_low / 1e6:.2f}M, {r.total_tokens_ci_high / 1e6:.2f}M]，"
+              f"约 {r.projected_hours:.1f} 小时 ({r.workers} 并发)")
+    print(f"\n估计结果已保存至: {config.TABLES_DIR}")
+    print("=" * 60)
+    return {'categories': categories, 'sentiment': sentiment, 'cost': cost, 'failure_rate': failure_rate}
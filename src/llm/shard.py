@@ -0,0 +1,218 @@
+"""
+分片执行：按 article_id 的哈希把语料确定性地划分为 N 份，
+每个进程/节点只处理自己的一份并写出独立的分片文件，最后由 merge 合并
+
+单机多进程测试示例 (先启动 scripts/mock_llm_server.py):
+    API_URL=http://127.0.0.1:8765/v1 python -m src.llm.shard launch --stage classify --num-shards 4
+多节点时每台机器各自运行:
+    python -m src.llm.shard run --stage classify --shard 0 --num-shards 4
+    ...
+全部完成后 (分片文件汇总到同一目录) 执行:
+    python -m src.llm.shard merge --stage classify --num-shards 4
+"""
+from src import config
+from src.data.data_clean import add_article_id
+import argparse
+import hashlib
+import subprocess
+import sys
+import time
+import pandas as pd
+
+SHARD_DIR = config.INTERIM_DATA_DIR / 'shards'
+
+# 各阶段的输入文件与合并后的输出文件
+STAGE_FILES = {
+    'classify': ('cleaned_data.csv', 'classify_data.csv'),
+    'summarize': ('result_data.csv', 'result_data.csv'),
+}
+
+def shard_of(article_id, num_shards):
+    """确定性分片：同一 article_id 在任何机器、任何进程上都落在同一分片"""
+    digest = hashlib.md5(str(article_id).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % num_shards
+
+def shard_path(stage, shard, num_shards, suffix='.csv'):
+    return SHARD_DIR / f'{stage}_shard_{shard:03d}_of_{num_shards:03d}{suffix}'
+
+def shard_stats_path(stage, shard, num_shards):
+    """分片进程独立的预处理统计文件，merge 时汇总，避免多进程同时追加同一文件"""
+    return shard_path(stage, shard, num_shards, '_stats.csv')
+
+def is_done(df, stage):
+    """判断每一行在该阶段是否已成功处理"""
+    if stage == 'classify':
+        return df['category'].isin(config.VALID_CATEGORIES)
+    summary = df['Summary_CN']
+    return summary.notna() & (summary != "") & (summary != "Error")
+
+def load_stage_input(stage):
+    """读取阶段输入并补齐 article_id"""
+    input_name, _ = STAGE_FILES[stage]
+    df = pd.read_csv(config.PROCESSED_DATA_DIR / input_name)
+    return add_article_id(df)
+
+def run_shard(shard, num_shards, stage='classify', **kwargs):
+    """
+    处理单个分片
+    分片文件已存在时直接在其基础上续跑 (已完成的行会被跳过)
+    :param kwargs: 透传给 llm_classify_concurrently / llm_summarize_concurrently 的参数
+    """
+    if not 0 <= shard < num_shards:
+        raise ValueError(f"shard 必须在 [0, {num_shards}) 范围内，当前为 {shard}")
+    SHARD_DIR.mkdir(parents=True, exist_ok=True)
+    output_path = shard_path(stage, shard, num_shards)
+
+    if output_path.exists():
+        df = pd.read_csv(output_path)
+        print(f"📂 续跑已有分片文件: {output_path.name}")
+    else:
+        df = load_stage_input(stage)
+        mask = df['article_id'].map(lambda x: shard_of(x, num_shards) == shard)
+        df = df[mask].reset_index(drop=True)
+    print(f"🧩 分片 {shard + 1}/{num_shards} [{stage}]: {len(df)} 行")
+    kwargs.setdefault('stats_path', shard_stats_path(stage, shard, num_shards))
+
+    if stage == 'classify':
+        from src.llm.llm_classify import llm_classify_concurrently
+        llm_classify_concurrently(df, output_csv_path=output_path, **kwargs)
+    else:
+        from src.llm.llm_summarize import llm_summarize_concurrently
+        llm_summarize_concurrently(df, output_csv_path=output_path, **kwargs)
+    return df
+
+def merge_shards(num_shards, stage='classify'):
+    """
+    合并所有分片到阶段输出文件
+    - 冲突 (同一 article_id 出现在多个分片): 优先已成功处理的行，其次优先其归属分片中的行
+    - 缺失 (输入中存在但没有任何分片包含): 保留输入中的原始行 (未处理状态)，并输出缺失清单
+    """
+    print("-" * 50)
+    print(f"【合并分片】阶段: {stage}，分片数: {num_shards}")
+    base = load_stage_input(stage)
+
+    parts = []
+    for shard in range(num_shards):
+        path = shard_path(stage, shard, num_shards)
+        if not path.exists():
+            print(f"⚠️ 缺少分片文件: {path.name}")
+            continue
+        part = add_article_id(pd.read_csv(path))
+        part['_shard'] = shard
+        parts.append(part)
+    if not parts:
+        raise FileNotFoundError(f"未找到任何 {stage} 分片文件，请先运行 run_shard")
+    shards = pd.concat(parts, ignore_index=True)
+
+    # 冲突处理：按 (已完成, 是否归属分片) 排序后保留每个 article_id 的第一行
+    shards['_done'] = is_done(shards, stage)
+    shards['_owner'] = shards['article_id'].map(lambda x: shard_of(x, num_shards)) == shards['_shard']
+    conflicts = shards['article_id'].duplicated(keep=False)
+    if conflicts.any():
+        print(f"⚠️ 发现 {shards.loc[conflicts, 'article_id'].nunique()} 个 article_id 出现在多个分片中，按规则保留一份")
+    shards = (
+        shards.sort_values(['_done', '_owner'], ascending=False, kind='stable')
+        .drop_duplicates('article_id', keep='first')
+        .drop(columns=['_shard', '_done', '_owner'])
+    )
+
+    # 按输入顺序重排，补回缺失行
+    merged = base[['article_id']].merge(shards, on='article_id', how='left', indicator=True)
+    missing = merged['_merge'] == 'left_only'
+    merged = merged.drop(columns='_merge')
+    if missing.any():
+        base_rows = base.set_index('article_id').loc[merged.loc[missing, 'article_id']]
+        for col in base_rows.columns:
+            merged.loc[missing, col] = base_rows[col].values
+        missing_path = SHARD_DIR / f'{stage}_missing.csv'
+        merged.loc[missing, ['article_id']].to_csv(missing_path, index=False)
+        print(f"⚠️ {missing.sum()} 行未出现在任何分片中，已按未处理状态保留，清单见: {missing_path}")
+
+    # 汇总各分片的预处理统计 (汇总后删除，重复合并不会重复计入)
+    stats_files = [p for p in (shard_stats_path(stage, s, num_shards) for s in range(num_shards)) if p.exists()]
+    if stats_files:
+        from src.data.preprocess import STATS_PATH, append_stats
+        append_stats(pd.concat([pd.read_csv(p) for p in stats_files], ignore_index=True), STATS_PATH)
+        for p in stats_files:
+            p.unlink()
+        print(f"已汇总 {len(stats_files)} 个分片的预处理统计至: {STATS_PATH}")
+
+    # 保持输入文件的列顺序在前
+    columns = list(base.columns) + [c for c in merged.columns if c not in base.columns]
+    merged = merged[columns]
+
+    _, output_name = STAGE_FILES[stage]
+    output_path = config.PROCESSED_DATA_DIR / output_name
+    merged.to_csv(output_path, index=False, encoding='utf-8-sig')
+
+    done = is_done(merged, stage)
+    print(f"合并完成: {len(merged)} 行，已完成 {done.sum()} 行，未完成 {(~done).sum()} 行")
+    print(f"已保存至: {output_path}")
+    print("-" * 50)
+    if stage == 'summarize':
+        # 分片进程不写分析立方体与各索引，合并后统一入库
+        from src.llm.llm_summarize import refresh_downstream
+        refresh_downstream(merged[done])
+    return merged
+
+def launch_local(num_shards, stage='classify', extra_args=()):
+    """单机启动 num_shards 个子进程分别处理各分片，全部结束后自动合并 (各进程输出写入分片日志)"""
+    start_time = time.time()
+    SHARD_DIR.mkdir(parents=True, exist_ok=True)
+    logs = [open(shard_path(stage, shard, num_shards, '.log'), 'w', encoding='utf-8') for shard in range(num_shards)]
+    try:
+        procs = [
+            subprocess.Popen(
+                [sys.executable, '-m', 'src.llm.shard', 'run',
+                 '--stage', stage, '--shard', str(shard), '--num-shards', str(num_shards), *extra_args],
+                cwd=config.PROJECT_DIR,
+                stdout=log,
+                stderr=subprocess.STDOUT
+            )
+            for shard, log in enumerate(logs)
+        ]
+        print(f"🚀 已启动 {num_shards} 个分片进程，等待完成... (日志: {SHARD_DIR})")
+        codes = [p.wait() for p in procs]
+    finally:
+        for log in logs:
+            log.close()
+    failed = [i for i, code in enumerate(codes) if code != 0]
+    if failed:
+        print(f"❌ 以下分片进程异常退出: {failed} (可重新运行 run 续跑)")
+        for shard in failed:
+            print(f"   日志: {shard_path(stage, shard, num_shards, '.log')}")
+    print(f"⏱️ 分片处理耗时: {time.time() - start_time:.2f} 秒")
+    return merge_shards(num_shards, stage)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按 article_id 哈希分片执行 LLM 阶段")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('run', 'merge', 'launch'):
+        p = sub.add_parser(name)
+        p.add_argument('--stage', choices=sorted(STAGE_FILES), default='classify')
+        p.add_argument('--num-shards', type=int, required=True)
+        if name == 'run':
+            p.add_argument('--shard', type=int, required=True)
+        if name in ('run', 'launch'):
+            p.add_argument('--max-workers', type=int, default=None)
+            p.add_argument('--stream', action='store_true', help="(classify) 流式输出")
+            p.add_argument('--stop-after-category', action='store_true', help="(classify) 只生成 category")
+    args = parser.parse_args(argv)
+
+    if args.command == 'merge':
+        merge_shards(args.num_shards, args.stage)
+        return
+
+    kwargs = {'max_workers': args.max_workers}
+    extra_args = [] if args.max_workers is None else ['--max-workers', str(args.max_workers)]
+    if args.stage == 'classify':
+        kwargs.update(stream=args.stream, stop_after_category=args.stop_after_category)
+        extra_args += ['--stream'] * args.stream + ['--stop-after-category'] * args.stop_after_category
+
+    if args.command == 'run':
+        run_shard(args.shard, args.num_shards, args.stage, **kwargs)
+    else:
+        launch_local(args.num_shards, args.stage, extra_args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+"""
+情感信号引擎：从分析立方体的日度聚合出发，按 分类 / 媒体 计算
+滚动窗口与指数加权 (EWMA) 的 文章量、平均情感序列，并在线检测异常
+
+- 情感哨兵值 -999 (及缺失得分) 只计入文章量，不参与情感计算
+- 文章量突增: 当日文章量相对 EWMA 均值/方差的 z 值超过阈值
+- 情感突变: 当日平均情感相对慢速基线的标准化偏差做双向 CUSUM，累计量越过阈值即报警
+- 所有序列作为矩阵的列同时按天推进 (NumPy 向量化)；状态持久化后，新增一天只需推进一步
+  已处理日期的数据发生变化 (迟到的文章、重新摘要或重标注) 时，从变化日期之前最近的检查点重算
+"""
+from src import config
+from src.data.analytics_cube import load_cube, ERROR_SCORE
+import pickle
+import time
+import numpy as np
+import pandas as pd
+
+STATE_PATH = config.PROCESSED_DATA_DIR / 'sentiment_signals_state.pkl'
+SERIES_PATH = config.PROCESSED_DATA_DIR / 'sentiment_series.csv'
+ALERTS_PATH = config.TABLES_DIR / '情感预警.csv'
+
+DIMENSIONS = ('category', 'source_media')
+
+ROLLING_WINDOW = 7         # 滚动窗口 (天)
+EWMA_HALFLIFE = 7          # 快速 EWMA 半衰期 (天)，用于展示与文章量基线
+BASELINE_HALFLIFE = 28     # 慢速情感基线半衰期 (天)，用于 CUSUM
+WARMUP_DAYS = 14           # 序列出现后的预热天数，期间不报警
+MIN_VOLUME = 5             # 文章量突增的最小当日文章数
+VOLUME_Z = 3.0             # 文章量突增 z 值阈值
+CUSUM_K = 0.5              # CUSUM 容许偏移 (标准差单位)
+CUSUM_H = 5.0              # CUSUM 报警阈值
+MIN_SIGMA = 1.0            # 单篇情感标准差下限，避免基线过于平稳时误报
+CHECKPOINT_WEEKDAY = 6     # 每周日保存一次状态检查点，历史数据变化时从检查点重算
+
+SERIES_COLUMNS = [
+    'date', 'dimension', 'key', 'count', 'valid_count', 'mean_sentiment',
+    'rolling_count', 'rolling_sentiment', 'ewma_count', 'ewma_sentiment',
+    'baseline_sentiment', 'volume_z', 'cusum_pos', 'cusum_neg'
+]
+ALERT_COLUMNS = ['date', 'dimension', 'key', 'alert', 'value', 'baseline', 'statistic', 'count']
+
+def day_fingerprints(cube):
+    """每天立方体切片 (媒体 × 分类 × 情感得分 的文章数) 的指纹，用于发现已处理日期的变化"""
+    if cube.empty:
+        return pd.Series(dtype='uint64')
+    rows = pd.util.hash_pandas_object(cube[['source_media', 'category', 'Sentiment_Score', 'count']], index=False)
+    return rows.groupby(cube['date'].to_numpy()).sum()
+
+def _decay(halflife):
+    return 0.5 ** (1 / halflife)
+
+# ============ 日度矩阵 ============
+
+def daily_matrix(cube, days, keys=()):
+    """
+    把立方体整理为 (天数, 序列数) 的矩阵
+    :param keys: 已有的序列键 [(维度, 值)]，保持其顺序并在末尾追加新出现的序列
+    :return: (序列键列表, count, valid, score_sum, square_sum)
+    """
+    valid = cube['Sentiment_Score'] != ERROR_SCORE
+    data = pd.DataFrame({
+        'date': cube['date'],
+        'count': cube['count'],
+        'valid': cube['count'].where(valid, 0),
+        'score_sum': (cube['count'] * cube['Sentiment_Score']).where(valid, 0),
+        'square_sum': (cube['count'] * cube['Sentiment_Score'] ** 2).where(valid, 0),
+    })
+    fields = ['count', 'valid', 'score_sum', 'square_sum']
+    blocks = []
+    for dimension in DIMENSIONS:
+        block = data.assign(dimension=dimension, key=cube[dimension]).groupby(['date', 'dimension', 'key'])[fields].sum()
+        blocks.append(block)
+    wide = pd.concat(blocks).unstack(['dimension', 'key'], fill_value=0).reindex(days, fill_value=0)
+    found = list(dict.fromkeys(wide.columns.droplevel(0))) if not wide.empty else []
+    keys = list(dict.fromkeys([*keys, *found]))
+    columns = pd.MultiIndex.from_tuples(keys, names=['dimension', 'key']) if keys else None
+    matrices = [
+        wide[field].reindex(columns=columns, fill_value=0).to_numpy(dtype=float) if found
+        else np.zeros((len(days), len(keys)))
+        for field in fields
+    ]
+    return keys, *matrices
+
+# ============ 在线状态 ============
+
+class SignalState:
+    """所有序列的在线状态，每个属性为长度 = 序列数的数组"""
+
+    FIELDS = ('age', 'vol_mean', 'vol_var', 'fast_num', 'fast_den',
+              'base_num', 'base_den', 'base_square', 'cusum_pos', 'cusum_neg')
+
+    def __init__(self):
+        self.keys = []
+        self.last_day = None
+        # 已处理日期的立方体切片指纹，用于发现迟到或变化的数据
+        self.day_fingerprints = pd.Series(dtype='uint64')
+        # 检查点日期 -> 当天处理完后的状态快照
+        self.checkpoints = {}
+        for field in self.FIELDS:
+            setattr(self, field, np.zeros(0))
+        self.window = np.zeros((ROLLING_WINDOW, 0, 3))
+
+    def snapshot(self):
+        return {'keys': list(self.keys), 'window': self.window.copy(),
+                **{field: getattr(self, field).copy() for field in self.FIELDS}}
+
+    def rollback(self, day):
+        """
+        回退到 day 之前最近的检查点
+        :return: 是否找到检查点 (找不到时需从头重算)
+        """
+        earlier = [d for d in self.checkpoints if d < day]
+        if not earlier:
+            return False
+        restored = max(earlier)
+        snapshot = self.checkpoints[restored]
+        self.keys = list(snapshot['keys'])
+        self.window = snapshot['window'].copy()
+        for field in self.FIELDS:
+            setattr(self, field, snapshot[field].copy())
+        self.checkpoints = {d: v for d, v in self.checkpoints.items() if d <= restored}
+        self.day_fingerprints = self.day_fingerprints[self.day_fingerprints.index <= restored]
+        self.last_day = restored
+        return True
+
+    def align(self, keys):
+        """按新的序列键重排状态，新出现的序列从零开始"""
+        position = {k: i for i, k in enumerate(self.keys)}
+        index = np.array([position.get(k, -1) for k in keys], dtype=int)
+        known = index >= 0
+        for field in self.FIELDS:
+            old, new = getattr(self, field), np.zeros(len(keys))
+            new[known] = old[index[known]]
+            setattr(self, field, new)
+        window = np.zeros((ROLLING_WINDOW, len(keys), 3))
+        window[:, known] = self.window[:, index[known]]
+        self.window = window
+        self.keys = list(keys)
+
+    def step(self, count, valid, score_sum, square_sum):
+        """推进一天 (所有序列同时计算)，返回当天的序列值与报警标记"""
+        fast, slow = _decay(EWMA_HALFLIFE), _decay(BASELINE_HALFLIFE)
+        self.age += (self.age > 0) | (count > 0)
+        ready = self.age > WARMUP_DAYS
+
+        # 文章量：与此前的 EWMA 均值/方差比较 (方差下限取均值，近似泊松)
+        spread = np.sqrt(np.maximum(np.maximum(self.vol_var, self.vol_mean), 1.0))
+        volume_z = (count - self.vol_mean) / spread
+        volume_alert = ready & (count >= MIN_VOLUME) & (volume_z > VOLUME_Z)
+        volume_baseline = self.vol_mean.copy()
+        diff = count - self.vol_mean
+        self.vol_mean = self.vol_mean + (1 - fast) * diff
+        self.vol_var = fast * (self.vol_var + (1 - fast) * diff ** 2)
+
+        # 情感：当日均值相对慢速基线的标准化偏差 (按当日有效篇数缩放)
+        has = valid > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(has, score_sum / valid, np.nan)
+            baseline = np.where(self.base_den > 0, self.base_num / self.base_den, np.nan)
+            variance = self.base_square / self.base_den - baseline ** 2
+        sigma = np.sqrt(np.maximum(np.nan_to_num(variance), MIN_SIGMA ** 2))
+        z = np.where(has & (self.base_den > 0), (mean - baseline) * np.sqrt(valid) / sigma, 0.0)
+        z = np.nan_to_num(z)
+        self.cusum_pos = np.where(has, np.maximum(0.0, self.cusum_pos + z - CUSUM_K), self.cusum_pos)
+        self.cusum_neg = np.where(has, np.maximum(0.0, self.cusum_neg - z - CUSUM_K), self.cusum_neg)
+        sentiment_ready = ready & (self.base_den >= MIN_VOLUME)
+        up = sentiment_ready & (self.cusum_pos > CUSUM_H)
+        down = sentiment_ready & (self.cusum_neg > CUSUM_H)
+        cusum_pos, cusum_neg = self.cusum_pos.copy(), self.cusum_neg.copy()
+
+        self.base_num = slow * self.base_num + score_sum
+        self.base_den = slow * self.base_den + valid
+        self.base_square = slow * self.base_square + square_sum
+        # 报警后视为进入新状态：CUSUM 清零，基线从当天重新累计，避免同一次变化每天重复报警
+        changed = up | down
+        self.cusum_pos[changed] = 0.0
+        self.cusum_neg[changed] = 0.0
+        self.base_num[changed] = score_sum[changed]
+        self.base_den[changed] = valid[changed]
+        self.base_square[changed] = square_sum[changed]
+        self.fast_num = fast * self.fast_num + score_sum
+        self.fast_den = fast * self.fast_den + valid
+
+        # 滚动窗口：丢弃最早一天，追加当天
+        self.window = np.roll(self.window, -1, axis=0)
+        self.window[-1] = np.column_stack([count, valid, score_sum])
+        rolling = self.window.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = {
+                'count': count,
+                'valid_count': valid,
+                'mean_sentiment': mean,
+                'rolling_count': rolling[:, 0],
+                'rolling_sentiment': np.where(rolling[:, 1] > 0, rolling[:, 2] / rolling[:, 1], np.nan),
+                'ewma_count': self.vol_mean.copy(),
+                'ewma_sentiment': np.where(self.fast_den > 1e-9, self.fast_num / self.fast_den, np.nan),
+                'baseline_sentiment': baseline,
+                'volume_baseline': volume_baseline,
+                'volume_z': volume_z,
+                'cusum_pos': cusum_pos,
+                'cusum_neg': cusum_neg,
+            }
+        alerts = {'volume_spike': volume_alert, 'sentiment_up': up, 'sentiment_down': down}
+        return values, alerts
+
+# ============ 主入口 ============
+
+def _load_state(path):
+    if not path.exists():
+        return SignalState()
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+    # 旧版本状态没有指纹与检查点，从头重算
+    return state if hasattr(state, 'day_fingerprints') else SignalState()
+
+def _truncate_csv(path, last_day):
+    """只保留 last_day (含) 之前的行，用于从检查点重算"""
+    if not path.exists():
+        return
+    df = pd.read_csv(path)
+    df = df[pd.to_datetime(df['date']) <= last_day]
+    df.to_csv(path, index=False, encoding='utf-8-sig')
+
+def _append_csv(df, path, rewrite):
+    """追加写入 (新文件或重算时整体重写并带 BOM)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if rewrite or not path.exists():
+        df.to_csv(path, index=False, encoding='utf-8-sig')
+    else:
+        df.to_csv(path, mode='a', header=False, index=False, encoding='utf-8')
+
+def update_signals(
+    cube=None,
+    through=None,
+    state_path=STATE_PATH,
+    series_path=SERIES_PATH,
+    alerts_path=ALERTS_PATH
+):
+    """
+    增量计算情感信号并输出预警
+    :param cube: 分析立方体，默认读取已保存的立方体
+    :param through: 计算截至的日期，默认为立方体最后一天的前一天 (最后一天通常尚未采集完整)
+    :return: 本次新增的预警 DataFrame
+    """
+    print("-" * 50)
+    print("【情感信号】")
+    start_time = time.time()
+    if cube is None:
+        cube = load_cube()
+    if cube.empty:
+        print("立方体为空，跳过")
+        print("-" * 50)
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+    through = pd.Timestamp(through) if through is not None else cube['date'].max() - pd.Timedelta(days=1)
+
+    state = _load_state(state_path)
+    fingerprints = day_fingerprints(cube)
+    rewrite = state.last_day is None
+    if not rewrite:
+        processed = fingerprints[fingerprints.index <= state.last_day]
+        all_days = processed.index.union(state.day_fingerprints.index)
+        differs = (processed.reindex(all_days, fill_value=0)
+                   != state.day_fingerprints.reindex(all_days, fill_value=0)).to_numpy()
+        if differs.any():
+            changed_day = all_days[differs].min()
+            if state.rollback(changed_day):
+                print(f"⚠️ 已处理日期的数据发生变化 (自 {changed_day:%Y-%m-%d} 起)，"
+                      f"从检查点 {state.last_day:%Y-%m-%d} 之后重算")
+                _truncate_csv(series_path, state.last_day)
+                _truncate_csv(alerts_path, state.last_day)
+            else:
+                print(f"⚠️ 已处理日期的数据发生变化 (自 {changed_day:%Y-%m-%d} 起)，从头重算")
+                state, rewrite = SignalState(), True
+
+    first_day = cube['date'].min() if rewrite else state.last_day + pd.Timedelta(days=1)
+    days = pd.date_range(first_day, through, freq='D')
+    if days.empty:
+        if state.last_day is None:
+            print("暂无完整日期 (立方体最后一天视为尚未采集完整)")
+        else:
+            print(f"已计算至 {state.last_day:%Y-%m-%d}，无新的完整日期")
+        print("-" * 50)
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+
+    keys, count, valid, score_sum, square_sum = daily_matrix(cube[cube['date'].isin(days)], days, state.keys)
+    state.align(keys)
+
+    series_parts, alert_parts = [], []
+    dimension = np.array([k[0] for k in keys], dtype=object)
+    key = np.array([k[1] for k in keys], dtype=object)
+    for i, day in enumerate(days):
+        values, alerts = state.step(count[i], valid[i], score_sum[i], square_sum[i])
+        if day.weekday() == CHECKPOINT_WEEKDAY:
+            state.checkpoints[day] = state.snapshot()
+        active = state.age > 0
+        frame = pd.DataFrame({'date': day, 'dimension': dimension[active], 'key': key[active],
+                              **{name: v[active] for name, v in values.items()}})
+        series_parts.append(frame)
+        for alert, mask in alerts.items():
+            if not mask.any():
+                continue
+            is_volume = alert == 'volume_spike'
+            alert_parts.append(pd.DataFrame({
+                'date': day, 'dimension': dimension[mask], 'key': key[mask], 'alert': alert,
+                'value': (values['count'] if is_volume else values['mean_sentiment'])[mask],
+                'baseline': (values['volume_baseline'] if is_volume else values['baseline_sentiment'])[mask],
+                'statistic': (values['volume_z'] if is_volume else
+                              values['cusum_pos' if alert == 'sentiment_up' else 'cusum_neg'])[mask],
+                'count': values['count'][mask],
+            }))
+
+    series = pd.concat(series_parts, ignore_index=True)[SERIES_COLUMNS]
+    new_alerts = (pd.concat(alert_parts, ignore_index=True) if alert_parts
+                  else pd.DataFrame(columns=ALERT_COLUMNS))[ALERT_COLUMNS]
+    series['date'] = series['date'].dt.strftime('%Y-%m-%d')
+    new_alerts['date'] = pd.to_datetime(new_alerts['date']).dt.strftime('%Y-%m-%d')
+    _append_csv(series.round(4), series_path, rewrite)
+    _append_csv(new_alerts.round(4), alerts_path, rewrite)
+
+    state.last_day = days[-1]
+    state.day_fingerprints = fingerprints[fingerprints.index <= state.last_day]
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(state_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    print(f"推进 {len(days)} 天 ({days[0]:%Y-%m-%d} ~ {days[-1]:%Y-%m-%d})，{len(keys)} 条序列，"
+          f"新增预警 {len(new_alerts)} 条，耗时 {time.time() - start_time:.2f} 秒")
+    if not new_alerts.empty:
+        print(f"预警已写入: {alerts_path}")
+    print("-" * 50)
+    return new_alerts
+
+def build_signals(cube=None, through=None, state_path=STATE_PATH, series_path=SERIES_PATH, alerts_path=ALERTS_PATH):
+    """丢弃已有状态，从头计算全部历史"""
+    state_path.unlink(missing_ok=True)
+    return update_signals(cube, through, state_path, series_path, alerts_path)
+
+def load_series(dimension=None, key=None, series_path=SERIES_PATH):
+    """读取已计算的序列，可按维度与取值过滤"""
+    series = pd.read_csv(series_path, parse_dates=['date'])
+    if dimension is not None:
+        series = series[series['dimension'] == dimension]
+    if key is not None:
+        series = series[series['key'].isin([key] if isinstance(key, str) else key)]
+    return series.reset_index(drop=True)
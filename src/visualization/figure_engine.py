@@ -0,0 +1,232 @@
+"""
+图表引擎：按声明的图表清单在多个子进程中并行渲染 (Agg 后端)
+
+每张图以 "输入数据 + 图表类型 + 参数 + 样式" 的哈希作为缓存键，
+键未变化且图片仍存在时直接跳过；每个子进程只初始化一次绘图样式
+图表声明示例:
+    {'name': '01_议题分布占比图', 'kind': 'barh', 'data': series, 'options': {'title': '...', 'xlabel': '...'}}
+"""
+from src import config
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import inspect
+import json
+import multiprocessing
+import time
+import numpy as np
+import pandas as pd
+
+CACHE_PATH = config.FIGURES_DIR / '.figure_cache.json'
+
+# ============ 渲染函数 (在子进程中执行) ============
+
+def _render_barh(data, options):
+    """横向条形图，data 为 Series (索引为标签，值为数量)"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig, ax = plt.subplots(figsize=options.get('figsize', (10, 6)))
+    sns.barplot(
+        x=data.values,
+        y=data.index.astype(str),
+        hue=data.index.astype(str),
+        palette=options.get('palette', 'mako'),
+        legend=False,
+        ax=ax,
+        edgecolor="black",
+        linewidth=0.8,
+        zorder=3
+    )
+    ax.set_xlabel(options.get('xlabel', ''))
+    ax.set_ylabel(options.get('ylabel', ''))
+    sns.despine(trim=True)
+    ax.grid(axis='x', linestyle='--', alpha=0.4, zorder=0)
+    return fig, ax
+
+def _render_line(data, options):
+    """折线图，data 为 DataFrame (索引为时间，每列一条曲线)"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig, ax = plt.subplots(figsize=options.get('figsize', (10, 6)))
+    data.plot(ax=ax, marker='o', markersize=3, linewidth=1.2)
+    ax.set_xlabel(options.get('xlabel', ''))
+    ax.set_ylabel(options.get('ylabel', ''))
+    if data.shape[1] > 1:
+        ax.legend(loc='upper left', bbox_to_anchor=(1.01, 1), frameon=False)
+    sns.despine()
+    ax.grid(axis='y', linestyle='--', alpha=0.4)
+    return fig, ax
+
+def _render_heatmap(data, options):
+    """热力图，data 为 DataFrame (行列均为类别)"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig, ax = plt.subplots(figsize=options.get('figsize', (10, 6)))
+    sns.heatmap(
+        data,
+        ax=ax,
+        cmap=options.get('cmap', 'RdBu'),
+        center=options.get('center', 0),
+        annot=options.get('annot', True),
+        fmt=options.get('fmt', '.2f'),
+        linewidths=0.5,
+        linecolor='white'
+    )
+    ax.set_xlabel(options.get('xlabel', ''))
+    ax.set_ylabel(options.get('ylabel', ''))
+    return fig, ax
+
+def _render_radar(data, options):
+    """雷达图，data 为 Series (索引为维度，值为得分)"""
+    import matplotlib.pyplot as plt
+    labels = data.index.astype(str).tolist()
+    angles = np.linspace(0, 2 * np.pi, len(labels), endpoint=False).tolist()
+    values = data.values.tolist()
+    fig, ax = plt.subplots(figsize=options.get('figsize', (8, 8)), subplot_kw={'polar': True})
+    ax.plot(angles + angles[:1], values + values[:1], color='#003366', linewidth=1.5)
+    ax.fill(angles + angles[:1], values + values[:1], color='#003366', alpha=0.2)
+    ax.set_xticks(angles)
+    ax.set_xticklabels(labels)
+    if 'ylim' in options:
+        ax.set_ylim(*options['ylim'])
+    return fig, ax
+
+RENDERERS = {
+    'barh': _render_barh,
+    'line': _render_line,
+    'heatmap': _render_heatmap,
+    'radar': _render_radar,
+}
+
+# ============ 缓存键 ============
+
+def _style_fingerprint():
+    """样式指纹：绘图样式函数或渲染函数的代码变化时，所有缓存失效"""
+    from src.utils import Matplotlib_Seaborn_style
+    sources = [inspect.getsource(Matplotlib_Seaborn_style)]
+    sources += [inspect.getsource(func) for _, func in sorted(RENDERERS.items())]
+    return hashlib.sha256(''.join(sources).encode('utf-8')).hexdigest()
+
+def figure_key(spec, style_fingerprint):
+    """按 数据内容 + 图表类型 + 参数 + 样式 计算缓存键"""
+    data = spec['data']
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+    if isinstance(data, pd.DataFrame):
+        h.update(json.dumps([str(c) for c in data.columns], ensure_ascii=False).encode('utf-8'))
+    else:
+        h.update(str(data.name).encode('utf-8'))
+    h.update(spec['kind'].encode('utf-8'))
+    h.update(json.dumps(spec.get('options', {}), sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+    h.update(style_fingerprint.encode('utf-8'))
+    return h.hexdigest()
+
+# ============ 子进程 ============
+
+def _init_worker():
+    """子进程初始化：切换到 Agg 后端并只设置一次绘图样式"""
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+    from src.utils import Matplotlib_Seaborn_style
+    Matplotlib_Seaborn_style()
+
+def _render_one(spec, save_path):
+    """渲染单张图并返回耗时 (秒)"""
+    import matplotlib.pyplot as plt
+    start = time.perf_counter()
+    options = spec.get('options', {})
+    fig, ax = RENDERERS[spec['kind']](spec['data'], options)
+    if options.get('title'):
+        ax.set_title(options['title'], fontweight='bold', pad=20)
+    fig.tight_layout()
+    fig.savefig(save_path, dpi=options.get('dpi', 300), bbox_inches='tight')
+    plt.close(fig)
+    return time.perf_counter() - start
+
+# ============ 主入口 ============
+
+def render_figures(specs, max_workers=None, force=False, output_dir=config.FIGURES_DIR):
+    """
+    并行渲染图表清单
+    :param specs: 图表声明列表，每项包含 name / kind / data / options(可选)
+    :param force: 忽略缓存全部重画
+    :return: DataFrame，每张图的状态 (rendered / cached / failed) 与渲染耗时
+    """
+    print("-" * 50)
+    print(f"【图表引擎】共 {len(specs)} 张图")
+    names = [spec['name'] for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError("图表 name 不能重复")
+    for spec in specs:
+        if spec['kind'] not in RENDERERS:
+            raise ValueError(f"未知图表类型: {spec['kind']} (可选: {sorted(RENDERERS)})")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    cache_path = output_dir / CACHE_PATH.name
+    cache = json.loads(cache_path.read_text(encoding='utf-8')) if cache_path.exists() else {}
+    fingerprint = _style_fingerprint()
+
+    records, todo = [], []
+    for spec in specs:
+        key = figure_key(spec, fingerprint)
+        save_path = output_dir / f"{spec['name']}.png"
+        if not force and cache.get(spec['name']) == key and save_path.exists():
+            records.append({'name': spec['name'], 'status': 'cached', 'seconds': 0.0, 'path': str(save_path)})
+        else:
+            todo.append((spec, key, save_path))
+    print(f"命中缓存 {len(records)} 张，需渲染 {len(todo)} 张")
+
+    if todo:
+        start_time = time.time()
+        max_workers = max_workers or min(len(todo), multiprocessing.cpu_count())
+        # spawn 启动的子进程不继承 notebook 的交互式后端
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx, initializer=_init_worker) as executor:
+            future_to_item = {executor.submit(_render_one, spec, path): (spec, key, path) for spec, key, path in todo}
+            for future in as_completed(future_to_item):
+                spec, key, path = future_to_item[future]
+                try:
+                    seconds = future.result()
+                    cache[spec['name']] = key
+                    records.append({'name': spec['name'], 'status': 'rendered', 'seconds': seconds, 'path': str(path)})
+                    print(f" -> {spec['name']}: {seconds:.2f} 秒")
+                except Exception as e:
+                    cache.pop(spec['name'], None)
+                    records.append({'name': spec['name'], 'status': 'failed', 'seconds': np.nan, 'path': str(path)})
+                    print(f"❌ {spec['name']} 渲染失败: {e}")
+        cache_path.write_text(json.dumps(cache, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"渲染完成，总耗时 {time.time() - start_time:.2f} 秒 (进程数: {max_workers})")
+
+    report = pd.DataFrame(records).set_index('name').loc[names].reset_index()
+    print("-" * 50)
+    return report
+
+def report_figure_specs(cube=None, start=None, end=None, entity_index=None, top_entities=15):
+    """
+    根据分析立方体与实体索引生成报告常用图表声明
+    (议题分布、情感雷达、中方实体词频、周度趋势、媒体 × 议题情感)
+    """
+    from src.data.analytics_cube import load_cube, query_cube
+    from src.data.entity_index import load_entity_index
+    if cube is None:
+        cube = load_cube()
+    if entity_index is None:
+        entity_index = load_entity_index()
+    entities = entity_index.top_entities(side='CN', top=top_entities, start=start, end=end)
+    by_category = query_cube(by=('category',), start=start, end=end, cube=cube).set_index('category')
+    share = (by_category['count'] / by_category['count'].sum() * 100).sort_values(ascending=False)
+    weekly = query_cube(by=('category',), freq='W', start=start, end=end, cube=cube)
+    media_category = query_cube(by=('source_media', 'category'), start=start, end=end, cube=cube)
+    return [
+        {'name': '01_议题分布占比图', 'kind': 'barh', 'data': share.round(2),
+         'options': {'title': '核心议题关注度分布', 'xlabel': '占比 (%)'}},
+        {'name': '02_情感倾向雷达图', 'kind': 'radar', 'data': by_category['mean_sentiment'].dropna().round(3),
+         'options': {'title': '主要议题情感倾向 (平均分)', 'ylim': (-5, 5)}},
+        {'name': '03_实体词频统计图', 'kind': 'barh', 'data': entities,
+         'options': {'title': f'中方实体提及频次 Top {top_entities}', 'xlabel': '提及文章数', 'palette': 'rocket'}},
+        {'name': '04_议题周度趋势图', 'kind': 'line',
+         'data': weekly.pivot(index='period', columns='category', values='count').fillna(0),
+         'options': {'title': '议题周度文章数趋势', 'ylabel': '文章数'}},
+        {'name': '05_媒体议题情感热力图', 'kind': 'heatmap',
+         'data': media_category.pivot(index='source_media', columns='category', values='mean_sentiment').round(2),
+         'options': {'title': '各媒体分议题平均情感', 'figsize': (14, 8)}},
+    ]
@@ -0,0 +1,14 @@
+"""
+测试公共配置
+src.config 导入时要求 API_URL / API_KEY / MODEL_NAME / MAX_WORKERS 存在，
+单元测试不调用任何接口，未配置时填入占位值
+"""
+import os
+
+for key, value in {
+    'API_URL': 'http://127.0.0.1:9/v1',
+    'API_KEY': 'test',
+    'MODEL_NAME': 'test-model',
+    'MAX_WORKERS': '1',
+}.items():
+    os.environ.setdefault(key, value)
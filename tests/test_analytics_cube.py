@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from src.data import analytics_cube
+from src.data.analytics_cube import ERROR_SCORE, load_cube, query_cube, update_cube
+
+ROWS = pd.DataFrame({
+    'article_id': ['a1', 'a2', 'a3', 'a4'],
+    'publish_date': ['2024-01-01 08:00:00', '2024-01-01 20:00:00', '2024-01-03 09:30:00', '2024-01-09 00:00:00'],
+    'source_media': ['NDTV', 'NDTV', 'Mint', None],
+    'category': ['台湾问题', '台湾问题', '中国外交', '台湾问题'],
+    'Sentiment_Score': [-2, 4, 'Error', 1],
+})
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return tmp_path / 'cube.csv', tmp_path / 'members.csv'
+
+
+def test_update_cube_aggregates_by_day(paths):
+    cube = update_cube(ROWS, *paths)
+    assert cube['count'].sum() == 4
+    day = cube[(cube['date'] == '2024-01-01') & (cube['source_media'] == 'NDTV')]
+    assert sorted(day['Sentiment_Score']) == [-2, 4]
+    assert ERROR_SCORE in cube['Sentiment_Score'].tolist()
+    assert '未知' in cube['source_media'].tolist()
+
+
+def test_update_cube_moves_changed_labels(paths):
+    update_cube(ROWS, *paths)
+    changed = ROWS.iloc[[0]].assign(category='中国外交', Sentiment_Score=3)
+    cube = update_cube(changed, *paths)
+    assert cube['count'].sum() == 4
+    stats = query_cube(by=('category',), cube=cube).set_index('category')
+    assert stats.loc['台湾问题', 'count'] == 2
+    assert stats.loc['中国外交', 'count'] == 2
+    assert stats.loc['中国外交', 'valid_count'] == 1
+    assert stats.loc['中国外交', 'mean_sentiment'] == 3
+
+
+def test_query_cube_weekly_with_distribution(paths):
+    cube = update_cube(ROWS, *paths)
+    weekly = query_cube(by=('category',), freq='W', category='台湾问题', distribution=True, cube=cube)
+    assert weekly['period'].dt.weekday.eq(0).all()
+    assert weekly['count'].tolist() == [2, 1]
+    assert weekly.loc[0, 'score_-2'] == 1 and weekly.loc[0, 'score_4'] == 1
+    assert weekly.loc[0, 'mean_sentiment'] == 1
+
+
+def test_query_cube_rejects_unknown_freq(paths):
+    with pytest.raises(ValueError):
+        query_cube(freq='Q', cube=update_cube(ROWS, *paths))
+
+
+def test_query_cube_without_cube_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics_cube, 'CUBE_PATH', tmp_path / 'missing.csv')
+    with pytest.raises(FileNotFoundError, match='build_cube'):
+        query_cube()
+    assert load_cube(tmp_path / 'missing.csv').empty
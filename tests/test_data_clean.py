@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from src.data.data_clean import DigestSet, add_article_id, article_digest, digest_array
+
+
+def test_article_digest_is_stable_and_separates_missing():
+    assert article_digest('t', 'c') == article_digest('t', 'c')
+    assert len(article_digest('t', 'c')) == 16
+    assert article_digest(np.nan, 'c') != article_digest('nan', 'c')
+    assert article_digest('a b', 'c') != article_digest('a', 'b c')
+
+
+def test_digest_array_matches_article_ids():
+    df = pd.DataFrame({'title': ['a', 'b', None], 'content': ['x', 'y', 'z']})
+    ids, array = digest_array(df)
+    assert ids == add_article_id(df.copy())['article_id'].tolist()
+    assert array.dtype == np.uint64
+    assert [f'{v:016x}' for v in array] == ids
+
+
+def test_add_new_matches_drop_duplicates_across_batches():
+    rng = np.random.default_rng(0)
+    batches = [rng.integers(0, 500, size=200).astype(np.uint64) for _ in range(12)]
+    digests = DigestSet()
+    kept = np.concatenate([batch[digests.add_new(batch)] for batch in batches])
+    expected = pd.Series(np.concatenate(batches)).drop_duplicates().to_numpy()
+    np.testing.assert_array_equal(kept, expected)
+    assert len(digests) == len(expected)
+    # 相邻数组规模接近时合并，数组个数保持在对数级
+    assert len(digests.runs) <= 4
+    assert all((np.diff(run) > 0).all() for run in digests.runs)
+
+
+def test_contains_and_roundtrip(tmp_path):
+    digests = DigestSet(np.array([5, 1, 3, 3], dtype=np.uint64))
+    query = np.array([0, 1, 2, 3, 5, 9], dtype=np.uint64)
+    assert digests.contains(query).tolist() == [False, True, False, True, True, False]
+    path = tmp_path / 'digests.npy'
+    digests.add_new(np.array([9, 9], dtype=np.uint64))
+    digests.save(path)
+    loaded = DigestSet.load(path)
+    assert len(loaded) == 4
+    assert loaded.contains(query).tolist() == [False, True, False, True, True, True]
+    assert len(DigestSet.load(tmp_path / 'missing.npy')) == 0
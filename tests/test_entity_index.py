@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+from src.data.entity_index import EntityIndex, load_aliases, normalize_key, parse_entities
+
+ALIASES = {normalize_key(a): canonical for canonical, names in {
+    "People's Liberation Army": ["PLA"],
+    "Narendra Modi": ["Modi", "PM Modi"],
+}.items() for a in [canonical, *names]}
+
+
+def rows(**overrides):
+    data = {
+        'article_id': ['a1', 'a2', 'a3'],
+        'publish_date': ['2024-01-01', '2024-01-15', '2024-02-01'],
+        'category': ['中印边界/边境问题', '中印边界/边境问题', '中国外交'],
+        'source_media': ['NDTV', 'Mint', 'NDTV'],
+        'Chinese_Entities': ["['PLA', 'Wang Yi']", '["People\'s Liberation Army"]', "['Wang Yi']"],
+        'Indian_Entities': ["['PM Modi']", "['Modi', 'Indian Army']", '[]'],
+    }
+    data.update(overrides)
+    return pd.DataFrame(data)
+
+
+@pytest.mark.parametrize('cell, expected', [
+    ("['PLA', 'Wang Yi']", ['PLA', 'Wang Yi']),
+    ('["PLA"]', ['PLA']),
+    ('PLA, Wang Yi', ['PLA', 'Wang Yi']),
+    ("'PLA'", ['PLA']),
+    ('', []),
+    (None, []),
+    (['PLA', ''], ['PLA']),
+])
+def test_parse_entities(cell, expected):
+    assert parse_entities(cell) == expected
+
+
+def test_normalize_key():
+    assert normalize_key('  "The  Indian Army". ') == 'indian army'
+    assert normalize_key('PLA') == normalize_key('pla')
+
+
+def test_shared_aliases_skip_side_ambiguous_short_forms():
+    aliases = load_aliases()
+    assert aliases[normalize_key('PLA')] == "People's Liberation Army"
+    for short in ('MFA', 'Xi', 'ED', 'Indian Armed Forces'):
+        assert normalize_key(short) not in aliases
+
+
+def test_update_normalizes_and_counts_cooccurrence():
+    index = EntityIndex(ALIASES)
+    assert index.update(rows()) == (3, 0)
+    assert index.articles_of('pla') == ['a1', 'a2']
+    assert index.cooccurrence[("People's Liberation Army", 'Narendra Modi')] == 2
+    top = index.co_mentioned('Modi', side='IN', start='2024-01-10')
+    assert top.to_dict('records') == [{'query': 'Narendra Modi', 'entity': "People's Liberation Army", 'articles': 1}]
+    matrix = index.cooccurrence_matrix()
+    assert isinstance(matrix.dtype, pd.SparseDtype)
+    assert matrix.loc[("People's Liberation Army", 'Narendra Modi')] == 2
+
+
+def test_update_replaces_changed_articles_and_discard():
+    index = EntityIndex(ALIASES)
+    index.update(rows())
+    assert index.update(rows()) == (0, 0)
+    changed = rows().iloc[[0]].assign(Indian_Entities="['MEA']")
+    assert index.update(changed) == (0, 1)
+    assert index.cooccurrence[("People's Liberation Army", 'Narendra Modi')] == 1
+    assert index.discard(['a2', 'missing']) == 1
+    assert ("People's Liberation Army", 'Narendra Modi') not in index.cooccurrence
+    assert index.articles_of('Modi') == []
+
+
+def test_canonical_lookup_does_not_register():
+    index = EntityIndex(ALIASES)
+    assert index.canonical('"Unknown Entity"') == 'Unknown Entity'
+    assert index.display == {}
+
+
+def test_rebuild_applies_new_aliases():
+    index = EntityIndex(ALIASES)
+    index.update(rows())
+    rebuilt = index.rebuild({**ALIASES, normalize_key('Wang Yi'): 'Wang Yi (FM)'})
+    assert rebuilt.articles_of('Wang Yi (FM)') == ['a1', 'a3']
+    assert rebuilt.cooccurrence[('Wang Yi (FM)', 'Narendra Modi')] == 1
+    assert sum(rebuilt.cooccurrence.values()) == sum(index.cooccurrence.values())
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from src.data.analytics_cube import update_cube
+from src.data.entity_index import EntityIndex
+from src.visualization.figure_engine import figure_key, render_figures, report_figure_specs
+
+
+def spec(data, **options):
+    return {'name': 'fig', 'kind': 'barh', 'data': data, 'options': options}
+
+
+def test_figure_key_tracks_data_options_and_style():
+    data = pd.Series([1.0, 2.0], index=['a', 'b'], name='share')
+    key = figure_key(spec(data, title='T'), 'style')
+    assert figure_key(spec(data.copy(), title='T'), 'style') == key
+    assert figure_key(spec(data * 2, title='T'), 'style') != key
+    assert figure_key(spec(data.rename('other'), title='T'), 'style') != key
+    assert figure_key(spec(data, title='U'), 'style') != key
+    assert figure_key(spec(data, title='T'), 'new-style') != key
+
+
+def test_render_figures_validates_specs(tmp_path):
+    data = pd.Series([1.0], index=['a'])
+    with pytest.raises(ValueError, match='重复'):
+        render_figures([spec(data), spec(data)], output_dir=tmp_path)
+    with pytest.raises(ValueError, match='未知图表类型'):
+        render_figures([{'name': 'x', 'kind': 'pie', 'data': data}], output_dir=tmp_path)
+
+
+def test_report_figure_specs_include_entity_chart(tmp_path):
+    rows = pd.DataFrame({
+        'article_id': ['a1', 'a2'],
+        'publish_date': ['2024-01-01', '2024-01-08'],
+        'source_media': ['NDTV', 'Mint'],
+        'category': ['台湾问题', '中国外交'],
+        'Sentiment_Score': [-1, 2],
+        'Chinese_Entities': ["['Wang Yi', 'PLA']", "['Wang Yi']"],
+        'Indian_Entities': ["['MEA']", '[]'],
+    })
+    cube = update_cube(rows, tmp_path / 'cube.csv', tmp_path / 'members.csv')
+    index = EntityIndex(aliases={})
+    index.update(rows)
+    specs = {s['name']: s for s in report_figure_specs(cube=cube, entity_index=index)}
+    assert sorted(specs) == ['01_议题分布占比图', '02_情感倾向雷达图', '03_实体词频统计图',
+                             '04_议题周度趋势图', '05_媒体议题情感热力图']
+    assert specs['03_实体词频统计图']['data'].to_dict() == {'Wang Yi': 2, 'PLA': 1}
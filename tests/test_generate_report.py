@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.data import generate_report
+from src.data.generate_report import _pack, cache_key, cached_call, chinese_numeral, tex
+
+
+@pytest.mark.parametrize('n, expected', [
+    (1, '一'), (9, '九'), (10, '十'), (11, '十一'), (20, '二十'), (21, '二十一'), (99, '九十九'),
+    (0, '0'), (100, '100'),
+])
+def test_chinese_numeral(n, expected):
+    assert chinese_numeral(n) == expected
+
+
+def test_tex_escapes_special_characters():
+    assert tex('50% & $5_a {x}') == r'50\% \& \$5\_a \{x\}'
+    assert tex(None) == ''
+
+
+def test_pack_respects_budget_and_order():
+    items = ['one two three', 'four', 'five six', 'seven eight nine ten']
+    batches = _pack(items, 4)
+    assert [x for batch in batches for x in batch] == items
+    assert batches == [['one two three'], ['four', 'five six'], ['seven eight nine ten']]
+
+
+def test_cache_key_depends_on_prompt_and_content():
+    key = cache_key('system', 'user')
+    assert cache_key('system', 'user') == key
+    assert cache_key('system', 'other') != key
+    assert cache_key('system2', 'user') != key
+
+
+def test_cached_call_counts_under_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(generate_report, 'CACHE_DIR', tmp_path)
+    monkeypatch.setattr(generate_report, '_style_notes', lambda: '')
+    monkeypatch.setattr(generate_report, 'call_llm_report', lambda system, user: {'text': user})
+    stats = {'called': 0, 'cached': 0}
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda i: cached_call('sys', f'batch {i}', stats), range(200)))
+    assert results[5] == {'text': 'batch 5'}
+    assert stats == {'called': 200, 'cached': 0}
+    assert cached_call('sys', 'batch 5', stats) == {'text': 'batch 5'}
+    assert stats == {'called': 200, 'cached': 1}
+
+
+def test_cached_call_does_not_cache_failures(tmp_path, monkeypatch):
+    monkeypatch.setattr(generate_report, 'CACHE_DIR', tmp_path)
+    monkeypatch.setattr(generate_report, '_style_notes', lambda: '')
+    monkeypatch.setattr(generate_report, 'call_llm_report', lambda system, user: None)
+    stats = {'called': 0, 'cached': 0}
+    assert cached_call('sys', 'user', stats) is None
+    assert not list(tmp_path.iterdir())
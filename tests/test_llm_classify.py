@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from src.llm.llm_classify import IncrementalJSONParser
+
+RESPONSE = json.dumps(
+    {"category": "中印边界/边境问题", "reason": "文章讨论 \"LAC\" 对峙\n以及谈判", "score": -2,
+     "tags": ["border", {"k": "v}"}], "ok": True},
+    ensure_ascii=False,
+)
+
+
+def feed_in_chunks(text, size):
+    parser = IncrementalJSONParser()
+    for i in range(0, len(text), size):
+        parser.feed(text[i:i + size])
+    return parser
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, len(RESPONSE)])
+def test_chunked_feed_matches_json_loads(size):
+    assert feed_in_chunks(RESPONSE, size).fields == json.loads(RESPONSE)
+
+
+def test_category_completes_before_reason():
+    parser = IncrementalJSONParser()
+    done = parser.feed('```json\n{"category": "台湾问题", "rea')
+    assert done == {"category": "台湾问题"}
+    assert parser.feed('son": "未完') == {}
+    assert 'reason' not in parser.fields
+
+
+def test_partial_returns_generated_prefix():
+    parser = IncrementalJSONParser()
+    parser.feed('{"category": "其他", "reason": "被截断的\\')
+    assert parser.partial('reason') == "被截断的"
+    assert parser.partial('category') is None
+
+
+def test_partial_is_none_once_field_is_closed():
+    parser = IncrementalJSONParser()
+    parser.feed('{"reason": "完整"}')
+    assert parser.partial('reason') is None
+    assert parser.fields == {"reason": "完整"}
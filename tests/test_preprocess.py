@@ -0,0 +1,48 @@
+import hashlib
+
+from src import config
+from src.data.preprocess import (
+    ELLIPSIS_MARK, count_tokens, fit_to_budget, prompt_version, strip_boilerplate,
+)
+
+
+def test_fit_to_budget_keeps_short_text():
+    text = "Short article.\nSecond line."
+    assert fit_to_budget(text, 100) == text
+    assert fit_to_budget(text, None) == text
+
+
+def test_fit_to_budget_joins_lead_and_tail():
+    paragraphs = [f"Paragraph {i} " + "word " * 20 for i in range(10)]
+    result = fit_to_budget('\n'.join(paragraphs), 60)
+    lead, tail = result.split(ELLIPSIS_MARK)
+    assert lead.startswith("Paragraph 0")
+    assert tail.endswith(paragraphs[-1].strip())
+    assert count_tokens(lead) + count_tokens(tail) <= 60
+
+
+def test_fit_to_budget_without_tail_has_no_marker():
+    # 单句无法切分时，导语截取后不剩结尾段落
+    result = fit_to_budget("word " * 100, 10)
+    assert ELLIPSIS_MARK not in result
+    assert 0 < count_tokens(result) <= 10
+
+
+def test_strip_boilerplate_removes_byline_and_footer():
+    text = "By John Smith\nThe talks resumed on Monday.\nAlso Read: Another story\nBorder patrol continues."
+    assert strip_boilerplate(text) == "The talks resumed on Monday.\nBorder patrol continues."
+
+
+def test_strip_boilerplate_keeps_one_line_article():
+    text = "Copyright 2024 ruling: the court said the treaty stands and both sides agreed to talks."
+    assert strip_boilerplate(text) == text
+
+
+def test_prompt_version_includes_preprocess_settings(monkeypatch):
+    raw = prompt_version('classify')
+    assert raw == hashlib.sha256(config.SYSTEM_PROMPT_01.encode('utf-8')).hexdigest()[:12]
+    processed = prompt_version('classify', preprocess=True)
+    assert processed != raw
+    monkeypatch.setitem(config.TOKEN_BUDGETS, 'classify', 999)
+    assert prompt_version('classify', preprocess=True) != processed
+    assert prompt_version('classify') == raw
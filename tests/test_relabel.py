@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import config
+from src.llm.llm_classify import classify_prompt_version
+from src.llm.relabel import UNVERSIONED, _versions, change_rates, label_diff, stale_mask, wilson_interval
+
+
+@pytest.mark.parametrize('k, n, low, high', [
+    (0, 10, 0.0, 0.2775),
+    (5, 10, 0.2366, 0.7634),
+    (10, 10, 0.7225, 1.0),
+    (1, 100, 0.0018, 0.0545),
+])
+def test_wilson_interval_known_values(k, n, low, high):
+    lo, hi = wilson_interval(k, n)
+    assert lo == pytest.approx(low, abs=1e-4)
+    assert hi == pytest.approx(high, abs=1e-4)
+
+
+def test_wilson_interval_is_vectorized_and_handles_empty():
+    lo, hi = wilson_interval([0, 3], [0, 30])
+    assert np.isnan(lo[0]) and np.isnan(hi[0])
+    assert 0 < lo[1] < 0.1 < hi[1] < 1
+
+
+def test_stale_mask_uses_version_and_model():
+    current = classify_prompt_version()
+    df = _versions(pd.DataFrame({
+        'category': ['台湾问题', '台湾问题', '台湾问题', 'Error', '中国外交'],
+        'prompt_version': [current, 'old', current, 'old', None],
+        'label_model': [config.MODEL_NAME, config.MODEL_NAME, 'old-model', None, None],
+    }))
+    assert df['prompt_version'].iloc[4] == UNVERSIONED
+    assert stale_mask(df).tolist() == [False, True, True, False, True]
+
+
+def test_change_rates_flags_affected_categories():
+    calibration = pd.DataFrame({
+        'old_category': ['台湾问题'] * 10 + ['中国外交'] * 10,
+        'category': ['中国外交'] * 3 + ['台湾问题'] * 7 + ['中国外交'] * 9 + ['Error'],
+    })
+    rates = change_rates(calibration, min_change_rate=0.05)
+    assert rates.loc['台湾问题', ['n', 'changed']].tolist() == [10, 3]
+    assert rates.loc['台湾问题', 'top_destination'] == '中国外交'
+    assert rates.loc['台湾问题', 'affected']
+    assert rates.loc['中国外交', 'n'] == 9 and not rates.loc['中国外交', 'affected']
+    # 校准样本中没有出现的分类保守地视为受影响
+    assert rates.loc['西藏/达赖喇嘛问题', 'affected']
+
+
+def test_label_diff_reports_changes():
+    before = pd.DataFrame({'article_id': ['a', 'b', 'c'], 'category': ['台湾问题', '中国外交', None],
+                           'prompt_version': ['v1', 'v1', 'v1']})
+    after = pd.DataFrame({'article_id': ['a', 'b', 'c'], 'category': ['台湾问题', '台湾问题', '其他'],
+                          'prompt_version': ['v2', 'v2', 'v2']})
+    crosstab, changes = label_diff(before, after)
+    assert changes['article_id'].tolist() == ['b', 'c']
+    assert crosstab.loc['中国外交', '台湾问题'] == 1
+    assert crosstab.loc['未分类', '其他'] == 1
+    assert crosstab.loc['合计', '合计'] == 3
@@ -0,0 +1,82 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import config
+from src.llm import sample_estimate
+from src.llm.sample_estimate import (
+    POOLED_STRATUM, allocate, draw_sample, fill_from_sample, prompt_fingerprint, stratified_ratio,
+)
+
+
+def test_allocate_is_proportional_and_pools_small_strata():
+    sizes = pd.Series({'A': 600, 'B': 300, 'C': 90, 'D': 6, 'E': 4})
+    mapping, final, alloc = allocate(sizes, 100)
+    assert mapping['D'] == mapping['E'] == POOLED_STRATUM
+    assert final[POOLED_STRATUM] == 10
+    assert alloc['A'] == 60 and alloc['B'] == 30 and alloc['C'] == 9
+    # 合并层按比例只分到 1 条，补足到每层至少 2 条，实际样本量略大于 sample_size
+    assert alloc[POOLED_STRATUM] == 2 and alloc.sum() == 101
+    assert (alloc >= 2).all() and (alloc <= final).all()
+
+
+def test_draw_sample_is_reproducible():
+    df = pd.DataFrame({'x': range(200)})
+    strata = pd.Series(np.where(df['x'] < 150, 'big', 'small'), index=df.index)
+    first = draw_sample(df, 40, seed=1, strata=strata)
+    assert first.equals(draw_sample(df, 40, seed=1, strata=strata))
+    assert first['stratum'].value_counts().to_dict() == {'big': 30, 'small': 10}
+    assert first.groupby('stratum')['N_h'].first().to_dict() == {'big': 150, 'small': 50}
+
+
+def sample_frame(values, strata, sizes):
+    return pd.DataFrame({'y': values, 'stratum': strata, 'N_h': [sizes[s] for s in strata]})
+
+
+def test_stratified_ratio_weights_strata_by_population():
+    sample = sample_frame([1, 1, 0, 0], ['a', 'a', 'b', 'b'], {'a': 30, 'b': 10})
+    est = stratified_ratio(sample, sample['y'])
+    assert est['estimate'] == pytest.approx(0.75)
+    assert est['se'] == 0 and est['n'] == 4
+
+
+def test_stratified_ratio_census_has_no_sampling_error():
+    sample = sample_frame([1, 0, 1, 1, 0], ['a', 'a', 'a', 'b', 'b'], {'a': 3, 'b': 2})
+    est = stratified_ratio(sample, sample['y'])
+    assert est['estimate'] == pytest.approx(0.6)
+    assert est['se'] == pytest.approx(0)
+
+
+def test_stratified_ratio_domain_and_empty_domain():
+    sample = sample_frame([4, 2, 0, 6], ['a', 'a', 'b', 'b'], {'a': 10, 'b': 10})
+    domain = pd.Series([True, False, False, True])
+    est = stratified_ratio(sample, sample['y'].where(domain, 0), domain)
+    assert est['estimate'] == pytest.approx(5.0)
+    assert est['n'] == 2
+    assert np.isnan(stratified_ratio(sample, sample['y'], np.zeros(4))['estimate'])
+
+
+def test_prompt_fingerprint_tracks_model_and_preprocess(monkeypatch):
+    raw = prompt_fingerprint('classify')
+    assert prompt_fingerprint('classify', preprocess=True) != raw
+    assert prompt_fingerprint('summarize') != raw
+    monkeypatch.setattr(config, 'MODEL_NAME', 'other-model')
+    assert prompt_fingerprint('classify') != raw
+
+
+def test_fill_from_sample_requires_matching_settings(tmp_path, monkeypatch):
+    path = tmp_path / 'classify_sample.csv'
+    monkeypatch.setattr(sample_estimate, 'META_PATH', tmp_path / 'meta.json')
+    monkeypatch.setitem(sample_estimate.SAMPLE_FILES, 'classify', path)
+    pd.DataFrame({'article_id': ['a1', 'a2'], 'category': ['台湾问题', 'Error'], 'reason': ['r1', 'r2'],
+                  'prompt_version': ['v1', None]}).to_csv(path, index=False)
+    meta = {'classify': {'fingerprint': prompt_fingerprint('classify', preprocess=True)}}
+    (tmp_path / 'meta.json').write_text(json.dumps(meta), encoding='utf-8')
+
+    df = pd.DataFrame({'article_id': ['a1', 'a2', 'a3'], 'category': [None, None, '中国外交']})
+    assert fill_from_sample(df, 'classify') == 0
+    assert fill_from_sample(df, 'classify', preprocess=True) == 1
+    assert df['category'].tolist() == ['台湾问题', None, '中国外交']
+    assert df.loc[0, 'prompt_version'] == 'v1'
@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+from src.data.search_index import build_match, desegment, search, segment, update_search_index
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('border talks', '"border" "talks"'),
+    ('"Line of Actual Control"', '"Line of Actual Control"'),
+    ('Ladakh*', '"Ladakh"*'),
+    ('边境', '"边  境"'),
+    ('border OR LAC', '"border" OR "LAC"'),
+    ('border NOT Ladakh', '"border" NOT "Ladakh"'),
+    ('border or lac', '"border" "or" "lac"'),
+    ('say "hi" there', '"say" "hi" "there"'),
+])
+def test_build_match_syntax(query, expected):
+    assert build_match(query) == expected
+
+
+@pytest.mark.parametrize('query', ['OR border', 'border OR', 'border OR OR LAC'])
+def test_build_match_drops_dangling_or(query):
+    assert 'OR OR' not in build_match(query)
+    assert not build_match(query).startswith('OR')
+    assert not build_match(query).endswith(('OR', 'NOT'))
+
+
+@pytest.mark.parametrize('query', ['NOT Ladakh', 'border OR NOT Ladakh', 'border NOT NOT Ladakh'])
+def test_build_match_rejects_not_without_left_term(query):
+    with pytest.raises(ValueError, match='NOT'):
+        build_match(query)
+
+
+@pytest.mark.parametrize('query', ['', '   ', 'OR', '""', '*'])
+def test_build_match_rejects_empty_queries(query):
+    with pytest.raises(ValueError):
+        build_match(query)
+
+
+def test_build_match_fields():
+    assert build_match('LAC', fields=('title', 'summary_en')) == '{title summary_en} : ("LAC")'
+    with pytest.raises(ValueError, match='未知检索字段'):
+        build_match('LAC', fields=('body',))
+
+
+def test_segment_roundtrip():
+    assert desegment(segment('中印边境 LAC 谈判')) == '中印边境 LAC 谈判'
+    assert segment(None) == ''
+
+
+def test_search_with_or_not_and_filters(tmp_path):
+    db = tmp_path / 'search.db'
+    df = pd.DataFrame({
+        'article_id': ['a1', 'a2', 'a3'],
+        'title': ['Border talks resume', 'Ladakh border patrol', 'Trade deficit widens'],
+        'content': ['Officials met at the LAC.', 'Troops patrol near Ladakh.', 'Imports from China rose.'],
+        'Summary_CN': ['中印边境谈判恢复', '拉达克边境巡逻', '贸易逆差扩大'],
+        'publish_date': ['2024-01-01', '2024-01-05', '2024-01-09'],
+        'source_media': ['NDTV', 'Mint', 'NDTV'],
+        'category': ['中印边界/边境问题', '中印边界/边境问题', '中印经贸与科技'],
+        'Sentiment_Score': [-1, -2, 0],
+    })
+    assert update_search_index(df, db) == (3, 0)
+    assert sorted(search('border', db_path=db)['article_id']) == ['a1', 'a2']
+    assert search('border NOT Ladakh', db_path=db)['article_id'].tolist() == ['a1']
+    assert sorted(search('OR trade OR Ladakh OR', db_path=db)['article_id']) == ['a2', 'a3']
+    assert search('边境', source_media='Mint', db_path=db)['article_id'].tolist() == ['a2']
+    result = search('谈判', db_path=db)
+    assert result.attrs['total'] == 1 and '【谈判】' in result.loc[0, 'snippet']
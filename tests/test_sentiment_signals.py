@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.models.sentiment_signals import (
+    CHECKPOINT_WEEKDAY, SignalState, build_signals, day_fingerprints, update_signals,
+)
+
+
+def make_cube(days=60, spike_day=None):
+    rng = np.random.default_rng(0)
+    rows = []
+    for day in pd.date_range('2024-01-01', periods=days, freq='D'):
+        for media in ('NDTV', 'Mint'):
+            count = 30 if day == spike_day and media == 'NDTV' else int(rng.integers(1, 4))
+            rows.append((day, media, '台湾问题', int(rng.integers(-3, 2)), count))
+    return pd.DataFrame(rows, columns=['date', 'source_media', 'category', 'Sentiment_Score', 'count'])
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return {'state_path': tmp_path / 'state.pkl', 'series_path': tmp_path / 'series.csv',
+            'alerts_path': tmp_path / 'alerts.csv'}
+
+
+def stepped_state(days):
+    state = SignalState()
+    state.align([('category', 'x'), ('source_media', 'y')])
+    for day in days:
+        state.step(np.array([2.0, 1.0]), np.array([2.0, 1.0]), np.array([-2.0, 3.0]), np.array([2.0, 9.0]))
+        if day.weekday() == CHECKPOINT_WEEKDAY:
+            state.checkpoints[day] = state.snapshot()
+    state.last_day = days[-1]
+    state.day_fingerprints = pd.Series(1, index=days, dtype='uint64')
+    return state
+
+
+def test_rollback_restores_latest_earlier_checkpoint():
+    days = pd.date_range('2024-01-01', periods=25, freq='D')
+    state = stepped_state(days)
+    sundays = sorted(state.checkpoints)
+    expected = state.checkpoints[sundays[1]]
+    assert state.rollback(sundays[2])
+    assert state.last_day == sundays[1]
+    assert sorted(state.checkpoints) == sundays[:2]
+    assert state.day_fingerprints.index.max() == sundays[1]
+    for field in SignalState.FIELDS:
+        np.testing.assert_array_equal(getattr(state, field), expected[field])
+    np.testing.assert_array_equal(state.window, expected['window'])
+    # 恢复的是副本，继续推进不影响检查点
+    state.age += 1
+    assert not np.array_equal(state.age, state.checkpoints[sundays[1]]['age'])
+
+
+def test_rollback_without_earlier_checkpoint():
+    days = pd.date_range('2024-01-01', periods=10, freq='D')
+    state = stepped_state(days)
+    assert not state.rollback(min(state.checkpoints))
+
+
+def test_day_fingerprints_detect_same_count_changes():
+    cube = make_cube(days=3)
+    changed = cube.copy()
+    changed.loc[0, 'Sentiment_Score'] += 1
+    before, after = day_fingerprints(cube), day_fingerprints(changed)
+    assert before.iloc[0] != after.iloc[0]
+    assert before.iloc[1:].equals(after.iloc[1:])
+
+
+def test_incremental_update_matches_rebuild(paths, tmp_path):
+    cube = make_cube()
+    update_signals(cube[cube['date'] <= '2024-01-31'], **paths)
+    update_signals(cube, **paths)
+    changed = cube.copy()
+    changed.loc[changed['date'] == '2024-02-10', 'Sentiment_Score'] = -5
+    update_signals(changed, **paths)
+
+    full = {k: tmp_path / f'full_{v.name}' for k, v in paths.items()}
+    build_signals(changed, **full)
+    pd.testing.assert_frame_equal(pd.read_csv(paths['series_path']), pd.read_csv(full['series_path']))
+    pd.testing.assert_frame_equal(pd.read_csv(paths['alerts_path']), pd.read_csv(full['alerts_path']))
+
+
+def test_volume_spike_alert(paths):
+    alerts = update_signals(make_cube(spike_day=pd.Timestamp('2024-02-15')), **paths)
+    spikes = alerts[alerts['alert'] == 'volume_spike']
+    assert ('2024-02-15', 'NDTV') in set(zip(spikes['date'], spikes['key']))
+
+
+def test_empty_cube_is_skipped(paths):
+    assert update_signals(make_cube().iloc[0:0], **paths).empty
+    assert not paths['state_path'].exists()
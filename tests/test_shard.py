@@ -0,0 +1,48 @@
+import hashlib
+
+import pandas as pd
+
+from src import config
+from src.data.data_clean import add_article_id
+from src.llm import shard as shard_module
+from src.llm.shard import is_done, merge_shards, shard_of, shard_path
+
+
+def test_shard_of_is_deterministic_md5():
+    expected = int.from_bytes(hashlib.md5(b'abc').digest()[:8], 'big') % 7
+    assert shard_of('abc', 7) == expected
+    assert shard_of('abc', 7) == shard_of('abc', 7)
+
+
+def test_shard_of_covers_all_shards():
+    counts = pd.Series([shard_of(f'{i:016x}', 4) for i in range(4000)]).value_counts()
+    assert sorted(counts.index) == [0, 1, 2, 3]
+    assert counts.min() > 800
+
+
+def test_is_done_per_stage():
+    df = pd.DataFrame({'category': ['台湾问题', 'Error', None],
+                       'Summary_CN': ['摘要', 'Error', '']})
+    assert is_done(df, 'classify').tolist() == [True, False, False]
+    assert is_done(df, 'summarize').tolist() == [True, False, False]
+
+
+def test_merge_prefers_done_rows_and_keeps_missing(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'PROCESSED_DATA_DIR', tmp_path)
+    monkeypatch.setattr(shard_module, 'SHARD_DIR', tmp_path / 'shards')
+    (tmp_path / 'shards').mkdir()
+    base = add_article_id(pd.DataFrame({'title': ['a', 'b', 'c'], 'content': ['x', 'y', 'z']}))
+    base.to_csv(tmp_path / 'cleaned_data.csv', index=False)
+
+    first, second = base.iloc[[0, 1]].copy(), base.iloc[[1]].copy()
+    first['category'] = ['台湾问题', 'Error']
+    second['category'] = ['中国外交']
+    first.to_csv(shard_path('classify', 0, 2), index=False)
+    second.to_csv(shard_path('classify', 1, 2), index=False)
+
+    merged = merge_shards(2, 'classify')
+    assert merged['article_id'].tolist() == base['article_id'].tolist()
+    assert merged['category'].tolist()[:2] == ['台湾问题', '中国外交']
+    assert pd.isna(merged['category'].iloc[2])
+    assert (tmp_path / 'classify_data.csv').exists()
+    assert (tmp_path / 'shards' / 'classify_missing.csv').exists()